@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from organizer import FileOrganizer
+from utils import safe_copy_file, copy_and_verify, get_hash_spec
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# (file_info, destination folder, optional new name) — the arguments of FileOrganizer.organize_file
+OrganizeJob = Tuple[Dict, str, Optional[str]]
+
+
+class LocalFS:
+    """Blocking filesystem operations used by the engine; swap in a stand-in to simulate remote mounts."""
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def makedirs(self, path: str):
+        os.makedirs(path, exist_ok=True)
+
+    def getmtime(self, path: str) -> float:
+        return os.path.getmtime(path)
+
+    def device(self, path: str) -> int:
+        return os.stat(path).st_dev
+
+    def copy(self, src: str, dest: str, devices: Optional[Tuple[int, int]] = None) -> bool:
+        return safe_copy_file(src, dest, devices)
+
+    def copy_and_verify(self, src: str, dest: str, hash_name: str, expected_hash: Optional[str],
+                        devices: Optional[Tuple[int, int]] = None) -> Dict:
+        return copy_and_verify(src, dest, hash_name, expected_hash, devices)
+
+
+class AsyncOrganizeEngine:
+    """
+    Organizes many files at once for high-latency (SMB/NFS) destinations.
+    Name probes, directory creation and copies run concurrently on a thread
+    pool driven by asyncio, so round trips overlap instead of adding up.
+    - per_destination_limit caps operations in flight per output folder
+    - max_in_flight caps admitted jobs overall; the job iterable is consumed
+      lazily, so a huge batch never builds an unbounded backlog
+    Successful actions are appended to organizer.history in submission order,
+    exactly as if organize_file had been called for each job in turn.
+    """
+
+    def __init__(self, organizer: FileOrganizer, fs: Optional[LocalFS] = None,
+                 per_destination_limit: int = 8, max_in_flight: int = 64, verify: bool = False):
+        self.organizer = organizer
+        self.verify = verify
+        self.fs = fs or LocalFS()
+        self.per_destination_limit = per_destination_limit
+        self.max_in_flight = max_in_flight
+
+    def organize_files(self, jobs: Iterable[OrganizeJob]) -> List[Dict]:
+        """Blocking entry point; returns one action dict per job, in order."""
+        return asyncio.run(self.organize_files_async(jobs))
+
+    async def organize_files_async(self, jobs: Iterable[OrganizeJob]) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(
+            max_workers=max(self.max_in_flight, 1),
+            thread_name_prefix="AsyncOrganize"
+        )
+        admission = asyncio.Semaphore(self.max_in_flight)
+        destination_limits: Dict[str, asyncio.Semaphore] = {}
+        created_dirs: Dict[str, asyncio.Future] = {}  # Destination folder -> its device
+        source_devices: Dict[str, asyncio.Future] = {}  # Source folder -> its device
+        reserved: Set[str] = set()
+
+        async def call(func, *args):
+            return await loop.run_in_executor(executor, func, *args)
+
+        def prepare_dir(directory: str) -> int:
+            self.fs.makedirs(directory)
+            return self.fs.device(directory)
+
+        async def ensure_dir(directory: str) -> int:
+            # One makedirs + stat per folder per run, shared by every job that needs it;
+            # copies then get the devices and skip their own folder setup
+            future = created_dirs.get(directory)
+            if future is None:
+                future = created_dirs[directory] = asyncio.ensure_future(call(prepare_dir, directory))
+            return await future
+
+        async def source_device(directory: str) -> int:
+            future = source_devices.get(directory)
+            if future is None:
+                future = source_devices[directory] = asyncio.ensure_future(call(self.fs.device, directory))
+            return await future
+
+        async def unique_name(path: str) -> str:
+            directory = os.path.dirname(path)
+            name, ext = os.path.splitext(os.path.basename(path))
+            candidate, counter = path, 1
+            while True:
+                if candidate not in reserved:
+                    exists = await call(self.fs.exists, candidate)
+                    # Re-check after the await: another job may have claimed it meanwhile
+                    if not exists and candidate not in reserved:
+                        reserved.add(candidate)
+                        return candidate
+                    metrics.inc('unique_name.probes')
+                candidate = os.path.join(directory, f"{name}_{counter}{ext}")
+                counter += 1
+
+        async def organize(file_info: Dict, destination: str, new_name: Optional[str]) -> Dict:
+            limit = destination_limits.setdefault(destination, asyncio.Semaphore(self.per_destination_limit))
+            source_path = file_info['path']
+            filename = new_name or os.path.basename(source_path)
+            try:
+                async with limit:
+                    devices = (await source_device(os.path.dirname(source_path)), await ensure_dir(destination))
+                    dest_path = await unique_name(os.path.join(destination, filename))
+                    action = {
+                        'type': 'copy',
+                        'source': source_path,
+                        'destination': dest_path,
+                        'timestamp': await call(self.fs.getmtime, source_path),
+                        'success': False
+                    }
+                    with metrics.span('organize.async_copy'):
+                        if self.verify:
+                            hash_name, expected = get_hash_spec(file_info.get('metadata', {}))
+                            copied = await call(self.fs.copy_and_verify, source_path, dest_path, hash_name, expected,
+                                                devices)
+                            action.update({
+                                'digest': copied['digest'],
+                                'hash_algorithm': copied['hash_algorithm'],
+                                'verified': copied['verified'],
+                            })
+                            action['success'] = copied['success']
+                        else:
+                            action['success'] = await call(self.fs.copy, source_path, dest_path, devices)
+                    return action
+            except Exception as e:
+                logger.error(f"Error organizing {source_path} to {destination}: {e}")
+                return {
+                    'type': 'copy',
+                    'source': source_path,
+                    'destination': os.path.join(destination, filename),
+                    'timestamp': None,
+                    'success': False
+                }
+            finally:
+                admission.release()
+
+        try:
+            tasks = []
+            for file_info, destination, new_name in jobs:
+                await admission.acquire()  # Backpressure: wait for a free slot before admitting more
+                tasks.append(asyncio.ensure_future(organize(file_info, destination, new_name)))
+            actions = list(await asyncio.gather(*tasks))
+        finally:
+            executor.shutdown(wait=True)
+
+        succeeded = [action for action in actions if action['success']]
+        if succeeded:
+            self.organizer.history.extend(succeeded)
+            self.organizer.undo_stack.clear()  # Clear redo stack when new action is performed
+        return actions
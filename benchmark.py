@@ -0,0 +1,508 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from async_organizer import AsyncOrganizeEngine, LocalFS
+from metrics import metrics, profile_run
+from organizer import FileOrganizer
+from scanner import FileScanner
+from utils import (
+    get_file_hash,
+    generate_thumbnail,
+    safe_copy_file,
+    generate_unique_filename,
+)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ['.jpg', '.png']
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.mkv']
+
+DEFAULT_REGRESSION_THRESHOLD = 0.10  # 10% slower than baseline counts as a regression
+DEFAULT_LATENCY = 0.005  # Simulated per-operation round trip for network destinations
+
+
+def _random_size(rng: random.Random, min_size: int, max_size: int) -> int:
+    """Pick a file size log-uniformly so small and large files are both represented."""
+    if max_size <= min_size:
+        return min_size
+    low = max(min_size, 1)
+    return int(round(low * (max_size / low) ** rng.random()))
+
+
+def _make_image_bytes(rng: random.Random, ext: str, target_size: int) -> bytes:
+    """Render a small real image and pad it with trailing bytes up to target_size."""
+    width = rng.randint(64, 640)
+    height = rng.randint(64, 480)
+    color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+    img = Image.new('RGB', (width, height), color)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG' if ext == '.jpg' else 'PNG')
+    data = buffer.getvalue()
+    # Decoders stop at the end-of-image marker, so trailing padding keeps the file valid
+    if len(data) < target_size:
+        data += rng.randbytes(target_size - len(data))
+    return data
+
+
+def _make_video_bytes(rng: random.Random, target_size: int) -> bytes:
+    """Opaque payload standing in for a video; only the bytes matter for hashing and copying."""
+    return rng.randbytes(target_size)
+
+
+def generate_media_tree(
+    root: str,
+    file_count: int = 500,
+    depth: int = 3,
+    fanout: int = 4,
+    min_size: int = 4 * 1024,
+    max_size: int = 4 * 1024 * 1024,
+    image_ratio: float = 0.7,
+    duplicate_ratio: float = 0.1,
+    seed: int = 0,
+) -> Dict:
+    """
+    Generate a reproducible synthetic media tree.
+    Args:
+        root: Directory to populate (created if missing)
+        file_count: Total number of files to write
+        depth: Maximum directory nesting below root
+        fanout: Number of subdirectories per directory level
+        min_size: Smallest file size in bytes
+        max_size: Largest file size in bytes
+        image_ratio: Fraction of files that are images (the rest are videos)
+        duplicate_ratio: Fraction of files that are byte-for-byte copies of earlier files
+        seed: Random seed; the same parameters always produce the same tree
+    Returns:
+        Manifest describing the generated tree
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+
+    directories = [root]
+    frontier = [root]
+    for level in range(depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(fanout):
+                path = os.path.join(parent, f"d{level}_{i}")
+                os.makedirs(path, exist_ok=True)
+                next_frontier.append(path)
+        directories.extend(next_frontier)
+        frontier = next_frontier
+
+    written: List[Dict] = []
+    total_bytes = 0
+    duplicates = 0
+    images = 0
+
+    for index in range(file_count):
+        directory = rng.choice(directories)
+        if written and rng.random() < duplicate_ratio:
+            original = rng.choice(written)
+            ext = os.path.splitext(original['path'])[1]
+            path = os.path.join(directory, f"dup_{index:06d}{ext}")
+            shutil.copyfile(original['path'], path)
+            size = original['size']
+            duplicates += 1
+            if ext in IMAGE_EXTENSIONS:
+                images += 1
+        else:
+            size = _random_size(rng, min_size, max_size)
+            if rng.random() < image_ratio:
+                ext = rng.choice(IMAGE_EXTENSIONS)
+                data = _make_image_bytes(rng, ext, size)
+                images += 1
+            else:
+                ext = rng.choice(VIDEO_EXTENSIONS)
+                data = _make_video_bytes(rng, size)
+            size = len(data)
+            path = os.path.join(directory, f"file_{index:06d}{ext}")
+            with open(path, 'wb') as f:
+                f.write(data)
+        written.append({'path': path, 'size': size})
+        total_bytes += size
+
+    return {
+        'root': root,
+        'seed': seed,
+        'file_count': file_count,
+        'directories': len(directories),
+        'depth': depth,
+        'fanout': fanout,
+        'min_size': min_size,
+        'max_size': max_size,
+        'image_ratio': image_ratio,
+        'duplicate_ratio': duplicate_ratio,
+        'images': images,
+        'videos': file_count - images,
+        'duplicates': duplicates,
+        'total_bytes': total_bytes,
+        'files': [f['path'] for f in written],
+    }
+
+
+def _time_call(func: Callable[[], object], repeats: int, setup: Optional[Callable[[], None]] = None) -> List[float]:
+    timings = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _summarize(name: str, timings: List[float], operations: int, nbytes: int = 0) -> Dict:
+    best = min(timings)
+    result = {
+        'name': name,
+        'repeats': len(timings),
+        'operations': operations,
+        'min': best,
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+        'per_op': best / operations if operations else 0.0,
+    }
+    if nbytes:
+        result['bytes'] = nbytes
+        result['throughput_mb_s'] = nbytes / best / (1024 * 1024) if best else 0.0
+    return result
+
+
+def bench_scan_directory(manifest: Dict, repeats: int) -> Dict:
+    scanner = FileScanner()
+    timings = _time_call(lambda: scanner.scan_directory(manifest['root']), repeats)
+    return _summarize('scan_directory', timings, manifest['file_count'], manifest['total_bytes'])
+
+
+def bench_get_file_hash(manifest: Dict, repeats: int) -> Dict:
+    files = manifest['files']
+    timings = _time_call(lambda: [get_file_hash(path) for path in files], repeats)
+    return _summarize('get_file_hash', timings, len(files), manifest['total_bytes'])
+
+
+def bench_generate_thumbnail(manifest: Dict, repeats: int, container_size=(800, 600)) -> Dict:
+    images = [p for p in manifest['files'] if os.path.splitext(p)[1] in IMAGE_EXTENSIONS]
+    timings = _time_call(lambda: [generate_thumbnail(path, container_size) for path in images], repeats)
+    return _summarize('generate_thumbnail', timings, len(images))
+
+
+def bench_filter_files(manifest: Dict, repeats: int) -> Dict:
+    scanner = FileScanner()
+    scanner.scan_directory(manifest['root'])
+    keywords = ['file_', 'dup_', '.jpg', 'image/png', 'nomatch']
+
+    def run():
+        for keyword in keywords:
+            scanner.filter_files(keyword=keyword)
+        scanner.filter_files(extension='.mp4')
+
+    timings = _time_call(run, repeats)
+    return _summarize('filter_files', timings, len(keywords) + 1)
+
+
+def bench_safe_copy_file(manifest: Dict, repeats: int, workdir: str) -> Dict:
+    files = manifest['files']
+    destination = os.path.join(workdir, 'copy_dest')
+
+    def reset():
+        shutil.rmtree(destination, ignore_errors=True)
+
+    def run():
+        for index, path in enumerate(files):
+            safe_copy_file(path, os.path.join(destination, f"{index:06d}_{os.path.basename(path)}"))
+
+    timings = _time_call(run, repeats, setup=reset)
+    reset()
+    return _summarize('safe_copy_file', timings, len(files), manifest['total_bytes'])
+
+
+def bench_generate_unique_filename(repeats: int, workdir: str, collisions: int = 200) -> Dict:
+    """Worst case: every candidate name up to `collisions` already exists."""
+    directory = os.path.join(workdir, 'unique')
+    os.makedirs(directory, exist_ok=True)
+    open(os.path.join(directory, 'clip.mp4'), 'wb').close()
+    for counter in range(1, collisions):
+        open(os.path.join(directory, f"clip_{counter}.mp4"), 'wb').close()
+    target = os.path.join(directory, 'clip.mp4')
+    timings = _time_call(lambda: generate_unique_filename(target), repeats)
+    shutil.rmtree(directory, ignore_errors=True)
+    return _summarize('generate_unique_filename', timings, collisions)
+
+
+# Round trips inside one copy: creating and writing the file, then copystat
+_COPY_ROUND_TRIPS = 2
+# Extra round trips when the copy sets up its folder itself: makedirs and two stats
+_COPY_SETUP_ROUND_TRIPS = 3
+
+
+class LatencyFS(LocalFS):
+    """
+    Local filesystem stand-in that adds a fixed round-trip delay to every
+    underlying filesystem call, like SMB/NFS. A copy costs several round
+    trips, more if it has to create and stat its folder itself.
+    """
+
+    def __init__(self, latency: float = DEFAULT_LATENCY):
+        self.latency = latency
+
+    def _copy_delay(self, devices: Optional[Tuple[int, int]]):
+        round_trips = _COPY_ROUND_TRIPS + (_COPY_SETUP_ROUND_TRIPS if devices is None else 0)
+        time.sleep(self.latency * round_trips)
+
+    def exists(self, path: str) -> bool:
+        time.sleep(self.latency)
+        return super().exists(path)
+
+    def makedirs(self, path: str):
+        time.sleep(self.latency)
+        super().makedirs(path)
+
+    def getmtime(self, path: str) -> float:
+        time.sleep(self.latency)
+        return super().getmtime(path)
+
+    def device(self, path: str) -> int:
+        time.sleep(self.latency)
+        return super().device(path)
+
+    def copy(self, src: str, dest: str, devices: Optional[Tuple[int, int]] = None) -> bool:
+        self._copy_delay(devices)
+        return super().copy(src, dest, devices)
+
+    def copy_and_verify(self, src: str, dest: str, hash_name: str, expected_hash: Optional[str],
+                        devices: Optional[Tuple[int, int]] = None) -> Dict:
+        self._copy_delay(devices)
+        return super().copy_and_verify(src, dest, hash_name, expected_hash, devices)
+
+
+def _check_organize(jobs: List, actions: List[Dict], organizer: FileOrganizer) -> bool:
+    """Every job copied once, to distinct names, with history in submission order."""
+    destinations = [a['destination'] for a in actions]
+    return (
+        all(a['success'] for a in actions)
+        and len(set(destinations)) == len(jobs)
+        and all(os.path.exists(d) for d in destinations)
+        and [a['source'] for a in organizer.history] == [job[0]['path'] for job in jobs]
+    )
+
+
+def bench_organize_async(manifest: Dict, repeats: int, workdir: str,
+                         latency: float = DEFAULT_LATENCY, limit: int = 8) -> Dict:
+    """
+    Organize every file into two high-latency folders, first one operation at
+    a time and then with the async engine, and check both produce correct results.
+    All files share one name so the unique-name probing path is exercised too.
+    """
+    destination = os.path.join(workdir, 'organize_dest')
+    folders = [os.path.join(destination, 'a'), os.path.join(destination, 'b')]
+    jobs = [({'path': path}, folders[i % 2], 'same_name' + os.path.splitext(path)[1])
+            for i, path in enumerate(manifest['files'])]
+    fs = LatencyFS(latency)
+    verified = True
+
+    def run(per_destination_limit, max_in_flight):
+        nonlocal verified
+        organizer = FileOrganizer()
+        engine = AsyncOrganizeEngine(organizer, fs, per_destination_limit, max_in_flight)
+        verified = _check_organize(jobs, engine.organize_files(jobs), organizer) and verified
+
+    def reset():
+        shutil.rmtree(destination, ignore_errors=True)
+
+    serial = _time_call(lambda: run(1, 1), 1, setup=reset)
+    timings = _time_call(lambda: run(limit, limit * len(folders)), repeats, setup=reset)
+    reset()
+    result = _summarize('organize_async', timings, len(jobs), manifest['total_bytes'])
+    result.update({
+        'latency': latency,
+        'per_destination_limit': limit,
+        'serial': serial[0],
+        'speedup': serial[0] / result['min'] if result['min'] else 0.0,
+        'verified': verified,
+    })
+    return result
+
+
+BENCHMARKS = [
+    'scan_directory',
+    'get_file_hash',
+    'generate_thumbnail',
+    'filter_files',
+    'safe_copy_file',
+    'generate_unique_filename',
+    'organize_async',
+]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(
+    manifest: Dict,
+    workdir: str,
+    repeats: int = 3,
+    selected: Optional[List[str]] = None,
+    latency: float = DEFAULT_LATENCY,
+) -> Dict:
+    """Run the selected benchmarks against a generated tree and return a JSON-ready report."""
+    selected = selected or BENCHMARKS
+    runners = {
+        'scan_directory': lambda: bench_scan_directory(manifest, repeats),
+        'get_file_hash': lambda: bench_get_file_hash(manifest, repeats),
+        'generate_thumbnail': lambda: bench_generate_thumbnail(manifest, repeats),
+        'filter_files': lambda: bench_filter_files(manifest, repeats),
+        'safe_copy_file': lambda: bench_safe_copy_file(manifest, repeats, workdir),
+        'generate_unique_filename': lambda: bench_generate_unique_filename(repeats, workdir),
+        'organize_async': lambda: bench_organize_async(manifest, repeats, workdir, latency),
+    }
+
+    results = {}
+    for name in selected:
+        if name not in runners:
+            logger.error(f"Unknown benchmark: {name}")
+            continue
+        logger.info(f"Running benchmark {name}")
+        metrics.reset()
+        results[name] = runners[name]()
+        if metrics.enabled:
+            results[name]['metrics'] = metrics.snapshot()
+
+    tree = {k: v for k, v in manifest.items() if k not in ('files', 'root')}
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeats': repeats,
+        'tree': tree,
+        'results': results,
+    }
+
+
+def compare_reports(current: Dict, baseline: Dict, threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> List[Dict]:
+    """Return one entry per benchmark whose best time grew by more than `threshold`."""
+    regressions = []
+    for name, result in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('min'):
+            continue
+        change = (result['min'] - previous['min']) / previous['min']
+        if change > threshold:
+            regressions.append({
+                'name': name,
+                'baseline': previous['min'],
+                'current': result['min'],
+                'change': change,
+            })
+    return regressions
+
+
+# Everything the benchmarks create under the work directory
+WORKDIR_ENTRIES = ('tree', 'copy_dest', 'unique', 'organize_dest')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the scan, hash, thumbnail and copy hot paths")
+    parser.add_argument('--files', type=int, default=500, help="Number of synthetic files")
+    parser.add_argument('--depth', type=int, default=3, help="Directory nesting depth")
+    parser.add_argument('--fanout', type=int, default=4, help="Subdirectories per level")
+    parser.add_argument('--min-size', type=int, default=4 * 1024, help="Smallest file size in bytes")
+    parser.add_argument('--max-size', type=int, default=4 * 1024 * 1024, help="Largest file size in bytes")
+    parser.add_argument('--image-ratio', type=float, default=0.7, help="Fraction of images vs videos")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help="Fraction of duplicate files")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY,
+                        help="Simulated seconds per filesystem operation for organize_async")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="Run only these benchmarks")
+    parser.add_argument('--workdir', help="Where to build the tree (default: a temporary directory)")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated tree")
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    parser.add_argument('--compare', help="Baseline JSON report to check for regressions")
+    parser.add_argument('--metrics', action='store_true', help="Include per-stage metrics in the report")
+    parser.add_argument('--profile', metavar='PREFIX', help="Write cProfile/tracemalloc output to PREFIX.*")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Allowed slowdown vs baseline before failing (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        metrics.enable()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='media_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        manifest = generate_media_tree(
+            os.path.join(workdir, 'tree'),
+            file_count=args.files,
+            depth=args.depth,
+            fanout=args.fanout,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            image_ratio=args.image_ratio,
+            duplicate_ratio=args.duplicate_ratio,
+            seed=args.seed,
+        )
+        if args.profile:
+            with profile_run(args.profile, cpu=True, memory=True):
+                report = run_benchmarks(manifest, workdir, repeats=args.repeats, selected=args.only, latency=args.latency)
+        else:
+            report = run_benchmarks(manifest, workdir, repeats=args.repeats, selected=args.only, latency=args.latency)
+    finally:
+        if not args.keep:
+            if args.workdir:
+                # Never remove a directory the user pointed us at, only what we put in it
+                for name in WORKDIR_ENTRIES:
+                    shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    # A benchmark that produced wrong results fails the run regardless of timing
+    failed = [name for name, result in report['results'].items() if result.get('verified') is False]
+    for name in failed:
+        logger.error(f"Benchmark {name} failed verification")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.threshold)
+        for r in regressions:
+            logger.error(f"Regression in {r['name']}: {r['baseline']:.4f}s -> {r['current']:.4f}s ({r['change']:+.1%})")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import math
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, List, Set, Tuple
+
+from PIL import Image, ImageTk
+
+from scheduler import PRIORITY_PREVIEW, PRIORITY_BACKGROUND
+from thumbnails import DEFAULT_TILE_SIZE
+
+TILE_PADDING = 8
+LABEL_HEIGHT = 18
+
+
+class ContactSheet:
+    """
+    Grid of small thumbnails for triaging bursts of similar files.
+    Only tiles inside the viewport exist as canvas items; thumbnails for the
+    viewport (and one screen ahead) are requested in batches from a
+    ThumbnailBatcher through the GUI's TaskScheduler. When the viewport moves,
+    batches still queued for the old one are cancelled.
+    Click selects, Ctrl-click toggles, Shift-click extends; an output folder
+    button sends the whole selection to FileOrganizer in one batch.
+    """
+
+    def __init__(self, parent, files: List[Dict], batcher, scheduler,
+                 output_folders: Dict[str, str],
+                 on_organize: Callable[[List[Dict], str, str], None],
+                 tile_size: int = DEFAULT_TILE_SIZE, theme=None):
+        self.files = list(files)
+        self.batcher = batcher
+        self.scheduler = scheduler
+        self.on_organize = on_organize
+        self.tile_size = tile_size
+        self.cell = tile_size + TILE_PADDING * 2
+        self.group = f"contact-sheet-{id(self)}"
+        self.bg = getattr(theme, 'BG', "#2b2b2b")
+        self.fg = getattr(theme, 'FG', "#ffffff")
+        self.accent = getattr(theme, 'ACCENT', "#5294e2")
+
+        self.columns = 1
+        self.selected: Set[int] = set()
+        self.anchor = None
+        self.tiles: Dict[int, Tuple[int, int]] = {}  # index -> (frame, image) item ids; all items tagged tile-<index>
+        self.photos: Dict[int, ImageTk.PhotoImage] = {}   # Only for visible tiles
+        self.pending: Set[str] = set()
+        self.requested_range = None  # Viewport the queued batches were requested for
+        self.index_by_path: Dict[str, int] = {}
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Contact Sheet")
+        self.window.geometry("1200x800")
+        self.window.configure(bg=self.bg)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = ttk.Frame(self.window)
+        toolbar.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        ttk.Button(toolbar, text="Select All", command=self.select_all).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Clear", command=self.clear_selection).pack(side=tk.LEFT, padx=5)
+        self.selection_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.selection_var).pack(side=tk.LEFT, padx=10)
+        for folder_name, folder_path in output_folders.items():
+            ttk.Button(
+                toolbar,
+                text=f"→ {folder_name}",
+                command=lambda p=folder_path, n=folder_name: self.send_selection(p, n)
+            ).pack(side=tk.RIGHT, padx=2)
+
+        body = ttk.Frame(self.window)
+        body.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(body, bg=self.bg, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self.on_scroll)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.on_scroll("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.on_scroll("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.on_scroll("scroll", 1, "units"))
+
+        self.reindex()
+        self.update_selection_label()
+
+    def reindex(self):
+        self.index_by_path = {f['path']: i for i, f in enumerate(self.files)}
+
+    def layout(self):
+        """Recompute the grid for the current width and redraw the viewport."""
+        width = max(self.canvas.winfo_width(), self.cell)
+        self.columns = max(1, width // self.cell)
+        rows = math.ceil(len(self.files) / self.columns)
+        self.canvas.configure(
+            scrollregion=(0, 0, width, rows * (self.cell + LABEL_HEIGHT)),
+            yscrollincrement=self.cell + LABEL_HEIGHT
+        )
+        self.clear_tiles()
+        self.requested_range = None
+        self.render_visible()
+
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.render_visible()
+
+    def clear_tiles(self):
+        self.canvas.delete("all")
+        self.tiles.clear()
+        self.photos.clear()
+
+    def visible_range(self, extra_screens: float = 0) -> range:
+        row_height = self.cell + LABEL_HEIGHT
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        first_row = max(0, int(top // row_height))
+        last_row = int((top + height * (1 + extra_screens)) // row_height) + 1
+        return range(first_row * self.columns, min(len(self.files), last_row * self.columns))
+
+    def tile_origin(self, index: int) -> Tuple[int, int]:
+        row, column = divmod(index, self.columns)
+        return column * self.cell, row * (self.cell + LABEL_HEIGHT)
+
+    def render_visible(self):
+        """Create canvas items for tiles in view, drop the rest, and request missing thumbnails."""
+        visible = self.visible_range()
+        for index in [i for i in self.tiles if i not in visible]:
+            del self.tiles[index]
+            self.canvas.delete(f"tile-{index}")
+            self.photos.pop(index, None)
+
+        for index in visible:
+            if index not in self.tiles:
+                self.create_tile(index)
+
+        if visible == self.requested_range:
+            return
+        self.requested_range = visible
+        # Off-screen batches would otherwise hold the workers ahead of the new viewport
+        self.scheduler.cancel_group(self.group)
+        self.pending.clear()
+        self.request_thumbnails(visible, PRIORITY_PREVIEW)
+        prefetch = self.visible_range(extra_screens=1)
+        self.request_thumbnails(range(visible.stop, prefetch.stop), PRIORITY_BACKGROUND)
+
+    def create_tile(self, index: int):
+        x, y = self.tile_origin(index)
+        tag = f"tile-{index}"
+        frame = self.canvas.create_rectangle(
+            x + 2, y + 2, x + self.cell - 2, y + self.cell - 2,
+            outline=self.accent if index in self.selected else self.bg, width=3, tags=tag
+        )
+        image = self.canvas.create_image(x + self.cell // 2, y + self.cell // 2, anchor="center", tags=tag)
+        name = self.files[index]['metadata']['name']
+        self.canvas.create_text(
+            x + self.cell // 2, y + self.cell + LABEL_HEIGHT // 2 - 4,
+            text=name if len(name) <= 22 else name[:19] + "...", fill=self.fg, tags=tag
+        )
+        self.tiles[index] = (frame, image)
+        self.draw_thumbnail(index)
+
+    def draw_thumbnail(self, index: int):
+        try:
+            data = self.batcher.cache.get(self.files[index]['path'], self.tile_size)
+        except KeyError:
+            return
+        _, image = self.tiles[index]
+        if data is None:
+            x, y = self.tile_origin(index)
+            self.canvas.create_text(x + self.cell // 2, y + self.cell // 2, text="No preview",
+                                    fill=self.fg, tags=f"tile-{index}")
+            return
+        mode, size, raw = data
+        photo = ImageTk.PhotoImage(Image.frombytes(mode, size, raw))
+        self.photos[index] = photo
+        self.canvas.itemconfigure(image, image=photo)
+
+    def request_thumbnails(self, indices: range, priority: int):
+        paths = []
+        for index in indices:
+            path = self.files[index]['path']
+            if (path, self.tile_size) not in self.batcher.cache and path not in self.pending:
+                paths.append(path)
+        for batch in self.batcher.batches(paths):
+            self.pending.update(batch)
+            self.scheduler.submit(
+                self.batcher.run_batch,
+                batch,
+                self.tile_size,
+                priority=priority,
+                group=self.group,
+                callback=self.on_batch,
+                error_callback=lambda e, b=batch: self.pending.difference_update(b)
+            )
+
+    def on_batch(self, results: Dict):
+        for path, data in results.items():
+            self.pending.discard(path)
+            self.batcher.cache.put(path, self.tile_size, data)
+            index = self.index_by_path.get(path)
+            if index is not None and index in self.tiles:
+                self.draw_thumbnail(index)
+
+    def index_at(self, event) -> int:
+        x = self.canvas.canvasx(event.x)
+        y = self.canvas.canvasy(event.y)
+        column = int(x // self.cell)
+        row = int(y // (self.cell + LABEL_HEIGHT))
+        if column >= self.columns:
+            return -1
+        index = row * self.columns + column
+        return index if index < len(self.files) else -1
+
+    def on_click(self, event):
+        index = self.index_at(event)
+        if index < 0:
+            return
+        changed = set(self.selected)
+        if event.state & 0x0001 and self.anchor is not None:  # Shift: extend from anchor
+            low, high = sorted((self.anchor, index))
+            self.selected.update(range(low, high + 1))
+        elif event.state & 0x0004:  # Control: toggle
+            self.selected.symmetric_difference_update({index})
+            self.anchor = index
+        else:
+            self.selected = {index}
+            self.anchor = index
+        changed.symmetric_difference_update(self.selected)
+        changed.add(index)
+        for i in changed:
+            if i in self.tiles:
+                self.canvas.itemconfigure(self.tiles[i][0], outline=self.accent if i in self.selected else self.bg)
+        self.update_selection_label()
+
+    def select_all(self):
+        self.selected = set(range(len(self.files)))
+        self.layout()
+        self.update_selection_label()
+
+    def clear_selection(self):
+        self.selected.clear()
+        self.anchor = None
+        self.layout()
+        self.update_selection_label()
+
+    def update_selection_label(self):
+        self.selection_var.set(f"{len(self.selected)} of {len(self.files)} selected")
+
+    def send_selection(self, folder_path: str, folder_name: str):
+        """Hand the selection to FileOrganizer as one batch and drop it from the grid."""
+        if not self.selected:
+            return
+        chosen = [self.files[i] for i in sorted(self.selected)]
+        self.on_organize(chosen, folder_path, folder_name)
+        self.files = [f for i, f in enumerate(self.files) if i not in self.selected]
+        self.selected.clear()
+        self.anchor = None
+        self.reindex()
+        self.layout()
+        self.update_selection_label()
+
+    def close(self):
+        self.scheduler.cancel_group(self.group)
+        self.clear_tiles()
+        self.window.destroy()
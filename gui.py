@@ -1,14 +1,24 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 from PIL import Image, ImageTk
+import logging
 import os
+import threading
 from typing import Dict, List, Tuple, Optional
 from scanner import FileScanner
+from snapshot import open_snapshot
+from video_probe import VideoProber, VIDEO_EXTENSIONS
+from hasher import BackgroundHasher
+from scan_service import ScanServiceClient
 from organizer import FileOrganizer
 from utils import generate_thumbnail, get_file_metadata
-import threading
+from sorting import SortIndex
+from scheduler import TaskScheduler, PRIORITY_PREVIEW, PRIORITY_COPY, PRIORITY_BACKGROUND
 from video_player import VideoPlayer
-import cv2
+from thumbnails import ThumbnailBatcher
+from contact_sheet import ContactSheet
+
+logger = logging.getLogger(__name__)
 
 class DarkTheme:
     """Dark theme color scheme"""
@@ -19,15 +29,71 @@ class DarkTheme:
     BUTTON_FG = "#ffffff"
     ACCENT = "#5294e2"
     
+# Treeview column -> SortIndex key
+SORT_COLUMNS = {
+    "Name": "name",
+    "Type": "type",
+    "Size": "size",
+    "Modified": "modified",
+    "Dimensions": "dimensions",
+    "Duration": "duration",
+}
+
+def parse_record_range(text: str, count: int) -> Tuple[Optional[int], Optional[int]]:
+    """Parse "start-stop" (either side may be empty) into slice bounds; empty text means all."""
+    text = text.strip()
+    if not text:
+        return None, None
+    start, _, stop = text.partition('-')
+    start = int(start) if start.strip() else 0
+    stop = int(stop) if stop.strip() else count
+    if not 0 <= start <= stop <= count:
+        raise ValueError(f"Range must be within 0-{count}")
+    return start, stop
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def format_row(metadata: Dict) -> tuple:
+    """File list values for one record, in SORT_COLUMNS order."""
+    dimensions = metadata.get('dimensions')
+    return (
+        metadata['name'],
+        metadata['type'],
+        f"{metadata['size'] / 1024:.1f} KB",
+        metadata.get('modified', ''),
+        f"{dimensions[0]}x{dimensions[1]}" if isinstance(dimensions, (tuple, list)) else "",
+        format_duration(metadata.get('duration'))
+    )
+    
 class FileOrganizerGUI:
-    def __init__(self, root):
+    def __init__(self, root, scan_service_url: Optional[str] = None):
         self.root = root
         self.root.title("File Organizer")
         self.root.geometry("1800x1000")  # Increased window size
         
-        self.scanner = FileScanner()
+        self.background_hasher = BackgroundHasher()
+        self.background_hasher.start()
+        self.video_prober = VideoProber()
+        self.scanner = FileScanner(background_hasher=self.background_hasher, video_prober=self.video_prober)
+        # When set, scans come from a shared scan_service instead of this process
+        self.scan_client = ScanServiceClient(scan_service_url) if scan_service_url else None
+        self.last_scan_directory: Optional[str] = None
+        self.scan_cancel = threading.Event()  # Set to stop the running scan's walk
         self.organizer = FileOrganizer()
+        self.scheduler = TaskScheduler(self.root)
+        self.thumbnail_batcher: Optional[ThumbnailBatcher] = None  # Started on first Grid View
         self.current_files: List[Dict] = []
+        # id(record) -> Treeview item, created once per scan; sorting and filtering
+        # only reorder or detach these items
+        self.row_ids: Dict[int, str] = {}
+        self.sort_index = SortIndex()  # Cached per-column orders of scanner.scanned_files
+        self.sort_column: Optional[str] = None
+        self.sort_descending = False
         self.selected_file: Dict = None
         self.output_folders: Dict[str, str] = {}  # name: path
         self.current_thumbnail = None  # Keep reference to prevent garbage collection
@@ -85,9 +151,15 @@ class FileOrganizerGUI:
         toolbar.grid(row=0, column=0, sticky="ew", padx=5, pady=5)
         
         ttk.Button(toolbar, text="Scan Directory", command=self.scan_directory).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Rescan", command=self.rescan_directory).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Load Scan", command=self.load_scan).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Save Scan", command=self.save_scan).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Add Output Folder", command=self.add_output_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Grid View", command=self.open_contact_sheet).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Undo", command=self.undo_action).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Redo", command=self.redo_action).pack(side=tk.LEFT, padx=5)
+        self.verify_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(toolbar, text="Verify copies", variable=self.verify_var).pack(side=tk.LEFT, padx=5)
         
         # Search frame
         search_frame = ttk.Frame(toolbar)
@@ -103,10 +175,9 @@ class FileOrganizerGUI:
         
         # File list frame (left side)
         list_frame = ttk.Frame(main_frame)
-        self.file_list = ttk.Treeview(list_frame, columns=("Name", "Type", "Size"), show="headings")
-        self.file_list.heading("Name", text="Name")
-        self.file_list.heading("Type", text="Type")
-        self.file_list.heading("Size", text="Size")
+        self.file_list = ttk.Treeview(list_frame, columns=tuple(SORT_COLUMNS), show="headings")
+        for column in SORT_COLUMNS:
+            self.file_list.heading(column, text=column, command=lambda c=column: self.sort_by(c))
         self.file_list.bind('<<TreeviewSelect>>', self.on_file_select)
         
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.file_list.yview)
@@ -204,56 +275,6 @@ class FileOrganizerGUI:
         main_frame.add(list_frame, weight=1)
         main_frame.add(preview_frame, weight=3)
     
-    def generate_thumbnail(file_path: str, container_size: Tuple[int, int]) -> Optional[Image.Image]:
-        try:
-            if file_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
-                # Handle video files
-                cap = cv2.VideoCapture(file_path)
-                ret, frame = cap.read()
-                cap.release()
-                
-                if ret:
-                    # Convert BGR to RGB
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    img = Image.fromarray(frame_rgb)
-                else:
-                    return None
-            else:
-                # Handle image files
-                img = Image.open(file_path)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # Calculate scaling factors for both width and height
-            width_ratio = container_size[0] / img.width
-            height_ratio = container_size[1] / img.height
-            
-            # Use the smaller ratio to ensure the image fits entirely within the container
-            scale_factor = min(width_ratio, height_ratio) * 0.95  # 95% of the container size for padding
-            
-            # Calculate new dimensions
-            new_width = int(img.width * scale_factor)
-            new_height = int(img.height * scale_factor)
-            
-            # Resize image
-            resized_img = img.resize(
-                (new_width, new_height),
-                Image.Resampling.LANCZOS
-            )
-            
-            # Create centered background
-            background = Image.new('RGB', container_size, (43, 43, 43))
-            x = (container_size[0] - new_width) // 2
-            y = (container_size[1] - new_height) // 2
-            background.paste(resized_img, (x, y))
-            
-            return background
-            
-        except Exception as e:
-            return None
-        
     def create_status_bar(self):
         self.status_var = tk.StringVar()
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN)
@@ -311,38 +332,119 @@ class FileOrganizerGUI:
             messagebox.showwarning("Warning", "Please select a file first")
             return
             
+        file_info = self.selected_file
         new_name = self.rename_var.get()
-        result = self.organizer.organize_file(
-            self.selected_file,
+        self.status_var.set(f"Copying to {folder_name}: {file_info['metadata']['name']}")
+        
+        # Copy on the scheduler's copy lane and advance right away; put the file back if it fails
+        self.scheduler.submit(
+            self.organizer.organize_file,
+            file_info,
             folder_path,
-            new_name
+            new_name,
+            verify=self.verify_var.get(),
+            priority=PRIORITY_COPY,
+            callback=lambda result: self.finish_organizing(file_info, folder_name, result),
+            error_callback=lambda e: self.finish_organizing(file_info, folder_name, {'success': False})
         )
+        self.advance_past_selected()
         
+    def finish_organizing(self, file_info, folder_name, result):
+        """Report the outcome of a copy started by organize_to_folder."""
         if result['success']:
-            self.status_var.set(f"Moved to {folder_name}: {os.path.basename(result['destination'])}")
-            
-            # Store the current selection before removing it
-            selection = self.file_list.selection()
-            if selection:
-                current_idx = self.file_list.index(selection[0])
-                
-                # Remove the current item
-                self.file_list.delete(selection[0])
-                self.current_files = [f for f in self.current_files if f != self.selected_file]
-                
-                # Select the next item if available
-                if self.current_files:
-                    next_idx = min(current_idx, len(self.current_files) - 1)
-                    next_item = self.file_list.get_children()[next_idx]
-                    self.file_list.selection_set(next_item)
-                    self.file_list.see(next_item)
-                    self.on_file_select(None)
-                else:
-                    self.selected_file = None
-                    self.update_preview()
-                    self.update_metadata()
+            verified = " (verified)" if result.get('verified') else ""
+            self.status_var.set(f"Moved to {folder_name}: {os.path.basename(result['destination'])}{verified}")
         else:
-            self.status_var.set("Failed to organize file")
+            if result.get('verified') is False:
+                self.status_var.set("Copy failed verification: source does not match its scanned hash")
+            else:
+                self.status_var.set("Failed to organize file")
+            if file_info not in self.current_files:
+                self.current_files.append(file_info)
+                self.update_file_list()
+            return
+        self.forget_file(file_info)
+        
+    def open_contact_sheet(self):
+        """Show the current file list as a thumbnail grid for batch triage."""
+        if not self.current_files:
+            messagebox.showwarning("Warning", "No files to show")
+            return
+        if self.thumbnail_batcher is None:
+            self.thumbnail_batcher = ThumbnailBatcher()
+        ContactSheet(
+            self.root,
+            self.current_files,
+            self.thumbnail_batcher,
+            self.scheduler,
+            self.output_folders,
+            self.organize_batch,
+            theme=DarkTheme
+        )
+        
+    def organize_batch(self, files: List[Dict], folder_path: str, folder_name: str):
+        """Organize several files to one folder in a single batch."""
+        self.status_var.set(f"Copying {len(files)} files to {folder_name}")
+        self.scheduler.submit(
+            self.organizer.organize_files,
+            [(file_info, folder_path, None) for file_info in files],
+            verify=self.verify_var.get(),
+            priority=PRIORITY_COPY,
+            callback=lambda actions: self.finish_batch(files, folder_name, actions),
+            error_callback=lambda e: self.status_var.set(f"Failed to organize files: {e}")
+        )
+        
+    def finish_batch(self, files: List[Dict], folder_name: str, actions: List[Dict]):
+        organized = [file_info for file_info, action in zip(files, actions) if action['success']]
+        self.forget_files(organized)
+        succeeded = len(organized)
+        self.filter_files()
+        failed = len(files) - succeeded
+        suffix = f", {failed} failed" if failed else ""
+        self.status_var.set(f"Moved {succeeded} files to {folder_name}{suffix}")
+        
+    def forget_file(self, file_info: Dict):
+        """Drop an organized file from the working set and its sort orders."""
+        self.scanner.scanned_files = [f for f in self.scanner.scanned_files if f is not file_info]
+        self.sort_index.remove(file_info)
+        self.delete_rows([file_info])
+        
+    def forget_files(self, files: List[Dict]):
+        """Drop a batch of organized files with one pass over the working set."""
+        organized = {id(f) for f in files}
+        if not organized:
+            return
+        self.scanner.scanned_files = [f for f in self.scanner.scanned_files if id(f) not in organized]
+        self.sort_index.remove_many(files)
+        self.delete_rows(files)
+        
+    def restore_file(self, file_info: Dict):
+        """Put a file back into the working set after an undo."""
+        self.scanner.scanned_files.append(file_info)
+        self.sort_index.add(file_info)
+            
+    def advance_past_selected(self):
+        """Remove the selected file from the list and select the next one."""
+        # Store the current selection before removing it
+        selection = self.file_list.selection()
+        if selection:
+            current_idx = self.file_list.index(selection[0])
+            
+            # Remove the current item; detached, so a failed copy can put it back
+            self.file_list.detach(selection[0])
+            self.current_files = [f for f in self.current_files if f != self.selected_file]
+            
+            # Select the next item if available
+            if self.current_files:
+                next_idx = min(current_idx, len(self.current_files) - 1)
+                next_item = self.file_list.get_children()[next_idx]
+                self.file_list.selection_set(next_item)
+                self.file_list.see(next_item)
+                self.on_file_select(None)
+            else:
+                self.selected_file = None
+                self.update_preview()
+                self.update_metadata()
             
     def remove_organized_file(self):
         selection = self.file_list.selection()
@@ -350,7 +452,7 @@ class FileOrganizerGUI:
             return
             
         current_index = self.file_list.index(selection[0])
-        self.file_list.delete(selection[0])
+        self.file_list.detach(selection[0])
         
         # Select next item
         if current_index < len(self.current_files):
@@ -364,36 +466,169 @@ class FileOrganizerGUI:
     def scan_directory(self):
         directory = filedialog.askdirectory()
         if directory:
-            # Show loading indicator
-            self.loading_indicator.grid(row=3, column=0, sticky="ew", padx=5)
-            self.loading_indicator.start(10)
-            self.root.update()
+            self.start_scan(directory)
             
-            def scan_thread():
-                self.current_files = self.scanner.scan_directory(directory)
-                
-                # Update UI in main thread
-                self.root.after(0, self.finish_scanning)
+    def rescan_directory(self):
+        """Scan the last directory again, bypassing the scan service's cached result."""
+        if not self.last_scan_directory:
+            messagebox.showwarning("Warning", "Nothing scanned yet")
+            return
+        self.start_scan(self.last_scan_directory, refresh=True)
+            
+    def start_scan(self, directory: str, refresh: bool = False):
+        self.last_scan_directory = directory
+        # Show loading indicator
+        self.loading_indicator.grid(row=3, column=0, sticky="ew", padx=5)
+        self.loading_indicator.start(10)
+        self.root.update()
+        
+        cancel_event = self.cancel_scan()
+        self.scheduler.submit(
+            self.run_scan,
+            directory,
+            refresh,
+            cancel_event,
+            priority=PRIORITY_BACKGROUND,
+            group='scan',
+            callback=self.finish_scanning
+        )
             
-            threading.Thread(target=scan_thread, daemon=True).start()
+    def cancel_scan(self) -> threading.Event:
+        """Stop any scan still running and return the cancel event for the next one."""
+        # A newer scan replaces the results of any scan still running
+        self.scheduler.cancel_group('scan')
+        self.scan_cancel.set()
+        self.scan_cancel = threading.Event()
+        return self.scan_cancel
+            
+    def run_scan(self, directory: str, refresh: bool = False,
+                 cancel_event: Optional[threading.Event] = None) -> List[Dict]:
+        """Scan on a worker thread; the scheduler delivers the result to finish_scanning."""
+        if self.scan_client:
+            try:
+                return self.scan_client.scan_directory(directory, refresh=refresh, cancel_event=cancel_event)
+            except Exception as e:
+                logger.warning(f"Scan service unavailable, scanning locally: {e}")
+        # Its own scanner, so a cancelled scan still winding down never touches the current results
+        scanner = FileScanner(background_hasher=self.background_hasher, video_prober=self.video_prober)
+        return scanner.scan_directory(directory, cancel_event=cancel_event)
+            
+    def save_scan(self):
+        """Export the current scan so another workstation can load it."""
+        if not self.scanner.scanned_files:
+            messagebox.showwarning("Warning", "Nothing scanned yet")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Save Scan",
+            defaultextension=".mfsnap",
+            filetypes=[("Scan snapshot", "*.mfsnap")]
+        )
+        if path:
+            if self.scanner.export_snapshot(path):
+                self.status_var.set(f"Saved {len(self.scanner.scanned_files)} records to {os.path.basename(path)}")
+            else:
+                self.status_var.set("Failed to save scan")
             
-    def finish_scanning(self):
+    def load_scan(self):
+        """Load a scan exported by another workstation instead of rescanning."""
+        path = filedialog.askopenfilename(
+            title="Load Scan",
+            filetypes=[("Scan snapshot", "*.mfsnap"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            with open_snapshot(path) as snapshot:  # Constant time: reads only the trailer
+                count = len(snapshot)
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot open snapshot: {e}")
+            return
+        
+        # A slice lets several operators split one large snapshot between them
+        selection = simpledialog.askstring(
+            "Load Scan",
+            f"{count} records. Range to load (start-stop, empty for all):",
+            initialvalue=f"0-{count}",
+            parent=self.root
+        )
+        if selection is None:
+            return
+        try:
+            start, stop = parse_record_range(selection, count)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid range: {e}")
+            return
+        
+        self.status_var.set(f"Loading {os.path.basename(path)}...")
+        self.loading_indicator.grid(row=3, column=0, sticky="ew", padx=5)
+        self.loading_indicator.start(10)
+        # Decoding runs on a worker so a large snapshot never blocks the Tk loop
+        self.cancel_scan()
+        self.scheduler.submit(
+            FileScanner().import_snapshot,
+            path,
+            start,
+            stop,
+            priority=PRIORITY_BACKGROUND,
+            group='scan',
+            callback=self.finish_scanning
+        )
+            
+    def finish_scanning(self, files: List[Dict]):
         """Complete the scanning process and update UI."""
+        self.scanner.scanned_files = files
+        self.sort_index.set_records(files)
+        self.delete_rows()
+        self.add_rows(files)
+        self.current_files = self.apply_sort(list(files))
         self.update_file_list()
         self.status_var.set(f"Scanned {len(self.current_files)} files")
         self.loading_indicator.stop()
         self.loading_indicator.grid_remove()
             
+    def add_rows(self, files: List[Dict]):
+        """Create Treeview items for records that don't have one yet; update_file_list places them."""
+        for file_info in files:
+            if id(file_info) not in self.row_ids:
+                self.row_ids[id(file_info)] = self.file_list.insert("", "end", values=format_row(file_info['metadata']))
+                
+    def delete_rows(self, files: Optional[List[Dict]] = None):
+        """Delete the items of these records, or of every record when files is None."""
+        if files is None:
+            items = list(self.row_ids.values())
+            self.row_ids.clear()
+        else:
+            items = [item for item in (self.row_ids.pop(id(f), None) for f in files) if item]
+        if items:
+            self.file_list.delete(*items)
+            
     def update_file_list(self):
-        """Update the file list display with current files."""
-        self.file_list.delete(*self.file_list.get_children())
-        for file_info in self.current_files:
-            metadata = file_info['metadata']
-            self.file_list.insert("", "end", values=(
-                metadata['name'],
-                metadata['type'],
-                f"{metadata['size'] / 1024:.1f} KB"
-            ))
+        """Show current_files in order by reattaching their existing items in one call."""
+        self.add_rows(self.current_files)
+        self.file_list.set_children("", *(self.row_ids[id(f)] for f in self.current_files))
+            
+    def sort_by(self, column: str):
+        """Sort the file list by a column; clicking the same column again reverses it."""
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        for name in SORT_COLUMNS:
+            arrow = (" ▼" if self.sort_descending else " ▲") if name == column else ""
+            self.file_list.heading(name, text=name + arrow)
+        self.current_files = self.apply_sort(self.current_files)
+        self.update_file_list()
+        
+    def apply_sort(self, files: List[Dict]) -> List[Dict]:
+        """Return files in the current sort order, using the cached column order."""
+        if not self.sort_column:
+            return files
+        ordered = self.sort_index.order(SORT_COLUMNS[self.sort_column], self.sort_descending)
+        if len(files) == len(ordered) and not self.search_var.get():
+            return list(ordered)
+        wanted = {id(f) for f in files}
+        return [f for f in ordered if id(f) in wanted]
             
     def update_preview(self):
         """Update the preview display with the selected file."""
@@ -417,7 +652,7 @@ class FileOrganizerGUI:
             self.video_player = None
         
         # Check if the file is a video
-        if file_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
+        if file_path.lower().endswith(VIDEO_EXTENSIONS):
             # Hide canvas and show video player
             self.preview_canvas.pack_forget()
             self.video_player = VideoPlayer(self.preview_container, 
@@ -427,24 +662,37 @@ class FileOrganizerGUI:
             self.video_player.controls.pack(fill=tk.X, pady=5)
             self.video_player.load_video(file_path)
         else:
-            # Show image thumbnail
+            # Decode on the preview lane; only the latest selection is shown
             self.preview_canvas.pack(fill=tk.BOTH, expand=True)
-            thumbnail = generate_thumbnail(file_path, container_size)
-            if thumbnail:
-                self.current_thumbnail = ImageTk.PhotoImage(thumbnail)
-                
-                # Center the image in the fixed-size canvas
-                center_x = self.PREVIEW_WIDTH // 2
-                center_y = self.PREVIEW_HEIGHT // 2
+            self.scheduler.cancel_group('preview')
+            self.scheduler.submit(
+                generate_thumbnail,
+                file_path,
+                container_size,
+                priority=PRIORITY_PREVIEW,
+                group='preview',
+                callback=lambda thumbnail: self.show_thumbnail(file_path, thumbnail)
+            )
                 
-                self.preview_canvas.create_image(
-                    center_x,
-                    center_y,
-                    image=self.current_thumbnail,
-                    anchor="center"
-                )
-            else:
-                self.current_thumbnail = None
+    def show_thumbnail(self, file_path: str, thumbnail: Optional[Image.Image]):
+        """Draw a decoded preview if its file is still the selected one."""
+        if not self.selected_file or self.selected_file['path'] != file_path:
+            return
+        if thumbnail:
+            self.current_thumbnail = ImageTk.PhotoImage(thumbnail)
+            
+            # Center the image in the fixed-size canvas
+            center_x = self.PREVIEW_WIDTH // 2
+            center_y = self.PREVIEW_HEIGHT // 2
+            
+            self.preview_canvas.create_image(
+                center_x,
+                center_y,
+                image=self.current_thumbnail,
+                anchor="center"
+            )
+        else:
+            self.current_thumbnail = None
                 
     def on_file_select(self, event):
         """Handle file selection event."""
@@ -474,20 +722,29 @@ class FileOrganizerGUI:
     def filter_files(self):
         """Filter files based on search term."""
         search_term = self.search_var.get().lower()
-        self.current_files = self.scanner.filter_files(keyword=search_term)
+        self.current_files = self.apply_sort(self.scanner.filter_files(keyword=search_term))
         self.update_file_list()
         
     def undo_action(self):
         """Undo the last file organization action."""
+        # Runs on the copy lane so it is ordered after any copy still in flight
+        self.scheduler.submit(self.run_undo, priority=PRIORITY_COPY, callback=self.finish_undo)
+        
+    def run_undo(self) -> Tuple[Optional[Dict], Optional[Dict]]:
         result = self.organizer.undo_last_action()
+        if not result:
+            return None, None
+        return result, get_file_metadata(result['source'])
+        
+    def finish_undo(self, outcome):
+        result, metadata = outcome
         if result:
             # Add the file back to the list
             file_info = {
                 'path': result['source'],
-                'metadata': get_file_metadata(result['source'])
+                'metadata': metadata
             }
-            self.current_files.append(file_info)
-            self.update_file_list()
+            self.restore_file(file_info)
             # Reapply current filter after adding the file back
             self.filter_files()
             self.status_var.set(f"Undid: {result['type']} - {os.path.basename(result['destination'])}")
@@ -496,11 +753,12 @@ class FileOrganizerGUI:
             
     def redo_action(self):
         """Redo the last undone file organization action."""
-        result = self.organizer.redo_last_action()
+        self.scheduler.submit(self.organizer.redo_last_action, priority=PRIORITY_COPY, callback=self.finish_redo)
+        
+    def finish_redo(self, result):
         if result:
             # Remove the file from the list
-            self.current_files = [f for f in self.current_files if f['path'] != result['source']]
-            self.update_file_list()
+            self.forget_files([f for f in self.scanner.scanned_files if f['path'] == result['source']])
             # Reapply current filter after removing the file
             self.filter_files()
             self.status_var.set(f"Redid: {result['type']} - {os.path.basename(result['destination'])}")
@@ -509,5 +767,9 @@ class FileOrganizerGUI:
     
     def __del__(self):
         """Cleanup resources when the application closes."""
+        self.scheduler.shutdown()
+        if self.thumbnail_batcher:
+            self.thumbnail_batcher.shutdown()
+        self.background_hasher.stop()
         if self.video_player:
             self.video_player.cleanup()
\ No newline at end of file
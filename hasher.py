@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+from utils import SegmentedHash, iter_file_chunks, HASH_SEGMENT_SIZE
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".media_sorter", "hash_state")
+DEFAULT_DIGEST_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".media_sorter", "hash_digests.json")
+
+
+class DigestCache:
+    """Finished full hashes on disk, keyed by path, size and mtime so edited files are rehashed."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_DIGEST_CACHE_PATH):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, size: int, mtime: float) -> str:
+        return f"{os.path.abspath(path)}|{size}|{mtime}"
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error loading hash digest cache {self.path}: {e}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key: str, entry: Dict):
+        """Store a digest and write the cache; each entry stands for minutes of hashing."""
+        with self._lock:
+            self._load()[key] = entry
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._entries, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"Error saving hash digest cache {self.path}: {e}")
+
+
+class BackgroundHasher:
+    """
+    Computes full content hashes of large files on a low-priority worker thread.
+    Progress is checkpointed after every segment, so a file interrupted by a
+    restart picks up where it left off as long as its size and mtime are unchanged.
+    Finished digests are kept in a DigestCache, so rescanning an unchanged file
+    reuses its hash, and a file already queued is not queued again.
+    """
+
+    def __init__(self, algorithm: str = 'blake2b', segment_size: int = HASH_SEGMENT_SIZE,
+                 state_dir: str = DEFAULT_STATE_DIR, use_mmap: bool = True,
+                 on_complete: Optional[Callable[[Dict], None]] = None,
+                 cache: Optional[DigestCache] = None):
+        if algorithm not in hashlib.algorithms_available:
+            raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.segment_size = segment_size
+        self.state_dir = state_dir
+        self.use_mmap = use_mmap
+        self.on_complete = on_complete
+        self.cache = cache or DigestCache()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._waiting: Dict[str, List[Dict]] = {}  # Queued key -> scanned records to update
+        self._waiting_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="BackgroundHasher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False):
+        """Stop after the current segment; its progress is already saved."""
+        self._stop.set()
+        if wait and self._thread:
+            self._thread.join()
+
+    def submit(self, file_info: Dict):
+        """Queue a scanned file; its metadata['hash'] is replaced when hashing completes."""
+        metadata = file_info['metadata']
+        key = DigestCache.key(file_info['path'], metadata.get('size', 0), metadata.get('modified_ts', 0.0))
+        cached = self.cache.get(key)
+        if cached is not None and cached.get('algorithm') == self._new_hash().name:
+            metrics.inc('background_hash.cache_hits')
+            self._apply(file_info, cached)
+            return
+        with self._waiting_lock:
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                # Already queued by an earlier scan: update this scan's record too
+                waiting.append(file_info)
+                return
+            self._waiting[key] = [file_info]
+        self._queue.put(key)
+        metrics.inc('background_hash.queued')
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _apply(self, file_info: Dict, entry: Dict):
+        file_info['metadata']['hash'] = entry['hash']
+        file_info['metadata']['hash_algorithm'] = entry['algorithm']
+        if self.on_complete:
+            self.on_complete(file_info)
+
+    def _lower_priority(self):
+        # On Linux niceness is per thread, so this only affects the worker
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except Exception:
+            pass
+
+    def _run(self):
+        self._lower_priority()
+        while not self._stop.is_set():
+            try:
+                key = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._waiting_lock:
+                path = self._waiting[key][0]['path']
+            try:
+                digest = self.hash_file(path)
+            except Exception as e:
+                logger.error(f"Error hashing {path} in background: {e}")
+                digest = None
+            with self._waiting_lock:
+                waiting = self._waiting.pop(key)
+            try:
+                if digest:
+                    entry = {'hash': digest, 'algorithm': self._new_hash().name}
+                    for file_info in waiting:
+                        self._apply(file_info, entry)
+            except Exception as e:
+                logger.error(f"Error applying background hash for {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _new_hash(self, segments=None) -> SegmentedHash:
+        return SegmentedHash(self.algorithm, self.segment_size, segments)
+
+    def _state_path(self, filepath: str) -> str:
+        key = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()
+        return os.path.join(self.state_dir, f"{key}.json")
+
+    def _load_state(self, filepath: str, stat: os.stat_result) -> SegmentedHash:
+        try:
+            with open(self._state_path(filepath)) as f:
+                state = json.load(f)
+            if (state['size'] == stat.st_size and state['mtime'] == stat.st_mtime
+                    and state['algorithm'] == self.algorithm
+                    and state['segment_size'] == self.segment_size):
+                return self._new_hash(state['segments'])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ignoring unreadable hash state for {filepath}: {e}")
+        return self._new_hash()
+
+    def _save_state(self, filepath: str, stat: os.stat_result, hasher: SegmentedHash):
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            path = self._state_path(filepath)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'path': filepath,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'algorithm': self.algorithm,
+                    'segment_size': self.segment_size,
+                    'segments': hasher.segments,
+                }, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving hash state for {filepath}: {e}")
+
+    def _clear_state(self, filepath: str):
+        try:
+            os.remove(self._state_path(filepath))
+        except FileNotFoundError:
+            pass
+
+    def hash_file(self, filepath: str) -> Optional[str]:
+        """
+        Hash a file, resuming from a saved checkpoint if one matches.
+        Returns None if stopped before finishing.
+        """
+        stat = os.stat(filepath)
+        hasher = self._load_state(filepath, stat)
+        offset = hasher.completed_bytes
+        if offset:
+            metrics.inc('background_hash.resumed')
+
+        with metrics.span('background_hash'):
+            for chunk in iter_file_chunks(filepath, offset, use_mmap=self.use_mmap):
+                saved = len(hasher.segments)
+                hasher.update(chunk)
+                metrics.inc('background_hash.bytes', len(chunk))
+                if len(hasher.segments) != saved:
+                    self._save_state(filepath, stat, hasher)
+                    if self._stop.is_set():
+                        return None
+
+        digest = hasher.hexdigest()
+        # Cached before the checkpoint goes, so a finished hash is never lost
+        self.cache.put(DigestCache.key(filepath, stat.st_size, stat.st_mtime),
+                       {'hash': digest, 'algorithm': hasher.name})
+        self._clear_state(filepath)
+        return digest
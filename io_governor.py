@@ -0,0 +1,185 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FOREGROUND = 0  # Operator-initiated copies
+BACKGROUND = 1  # Scan-time hashing, background full hashes
+
+PRIORITY_NAMES = {FOREGROUND: 'foreground', BACKGROUND: 'background'}
+
+# Large reads for the operator's copies; smaller ones for background work so
+# it checks for foreground activity often and holds the disk for less time
+DEFAULT_READ_SIZES = {FOREGROUND: 1024 * 1024, BACKGROUND: 256 * 1024}
+
+# Upper bound on how long one background read waits for foreground I/O to finish
+MAX_BACKGROUND_PAUSE = 5.0
+
+
+class TokenBucket:
+    """Byte-rate limiter. A rate of 0 means unlimited."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            # Going negative is allowed; the caller sleeps off the debt
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay:
+            metrics.observe('io.throttle_wait', delay)
+            time.sleep(delay)
+
+
+class IOGovernor:
+    """
+    Shared arbiter for disk reads and copies.
+    - Per-device token buckets limit bytes/s for each priority class.
+    - While a foreground copy is active on a device, background reads on
+      that device pause (bounded by MAX_BACKGROUND_PAUSE per read).
+    - posix_fadvise hints mark reads as sequential and, for background
+      reads, drop the pages afterwards so hashing doesn't evict the cache.
+    """
+
+    def __init__(self, background_rate: float = 0, foreground_rate: float = 0,
+                 read_sizes: Optional[Dict[int, int]] = None):
+        self.default_rates = {FOREGROUND: foreground_rate, BACKGROUND: background_rate}
+        self.read_sizes = dict(read_sizes or DEFAULT_READ_SIZES)
+        self._device_rates: Dict[tuple, float] = {}
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._foreground: Dict[int, int] = {}
+        self._condition = threading.Condition()
+
+    def set_rate(self, priority: int, rate: float, device: Optional[int] = None):
+        """Set the bytes/s limit for a priority class, on one device or as the default."""
+        with self._condition:
+            if device is None:
+                self.default_rates[priority] = rate
+                self._buckets = {k: v for k, v in self._buckets.items() if k in self._device_rates}
+            else:
+                self._device_rates[(device, priority)] = rate
+                self._buckets.pop((device, priority), None)
+
+    def read_size(self, priority: int) -> int:
+        return self.read_sizes.get(priority, DEFAULT_READ_SIZES[FOREGROUND])
+
+    def is_limited(self, device: int, priority: int) -> bool:
+        return self._rate(device, priority) > 0
+
+    def _rate(self, device: int, priority: int) -> float:
+        return self._device_rates.get((device, priority), self.default_rates.get(priority, 0))
+
+    def _bucket(self, device: int, priority: int) -> TokenBucket:
+        key = (device, priority)
+        with self._condition:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self._rate(device, priority))
+            return bucket
+
+    @contextmanager
+    def foreground(self, *devices: int):
+        """Mark foreground I/O on these devices for the duration of the block."""
+        devices = set(devices)
+        with self._condition:
+            for device in devices:
+                self._foreground[device] = self._foreground.get(device, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                for device in devices:
+                    self._foreground[device] -= 1
+                    if not self._foreground[device]:
+                        del self._foreground[device]
+                self._condition.notify_all()
+
+    def throttle(self, device: int, nbytes: int, priority: int):
+        """Call before transferring nbytes; blocks as needed to honour priority and rate limits."""
+        if priority == BACKGROUND and self._foreground:
+            start = time.monotonic()
+            with self._condition:
+                while self._foreground.get(device):
+                    remaining = MAX_BACKGROUND_PAUSE - (time.monotonic() - start)
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            metrics.observe('io.background_yield', time.monotonic() - start)
+        self._bucket(device, priority).consume(nbytes)
+        metrics.inc(f"io.{PRIORITY_NAMES[priority]}.bytes", nbytes)
+
+    def advise_sequential(self, fd: int):
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+
+    def drop_cache(self, fd: int):
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+
+    def read_chunks(self, f, priority: int, chunk_size: Optional[int] = None) -> Iterable[bytes]:
+        """Read an open binary file to EOF under governance."""
+        fd = f.fileno()
+        device = os.fstat(fd).st_dev
+        chunk_size = chunk_size or self.read_size(priority)
+        self.advise_sequential(fd)
+        try:
+            while True:
+                self.throttle(device, chunk_size, priority)
+                buf = f.read(chunk_size)
+                if not buf:
+                    return
+                yield buf
+        finally:
+            if priority == BACKGROUND:
+                self.drop_cache(fd)
+
+
+def _parse_rate(value: str) -> float:
+    """Parse '50M', '512K' or a plain byte count."""
+    value = value.strip().upper()
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value or 0)
+
+
+def _rate_from_env(name: str) -> float:
+    """Rate from an environment variable; a bad value is logged and means unlimited."""
+    value = os.environ.get(name, "0")
+    try:
+        rate = _parse_rate(value)
+    except ValueError:
+        rate = -1
+    if not math.isfinite(rate) or rate < 0:
+        logger.error(f"Ignoring invalid {name}={value!r}; expected e.g. 40M")
+        return 0
+    return rate
+
+
+governor = IOGovernor(
+    background_rate=_rate_from_env("MEDIA_SORTER_BACKGROUND_IO_RATE"),
+    foreground_rate=_rate_from_env("MEDIA_SORTER_FOREGROUND_IO_RATE"),
+)
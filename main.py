@@ -2,6 +2,8 @@ import tkinter as tk
 from gui import FileOrganizerGUI
 import sys
 import os
+import atexit
+from metrics import metrics, profile_run
 
 def setup_environment():
     import mimetypes
@@ -12,9 +14,16 @@ def setup_environment():
     mimetypes.add_type('audio/mp3', '.mp3')
     mimetypes.add_type('video/webm', '.webm')
 
+def setup_instrumentation():
+    # MEDIA_SORTER_METRICS=<path> enables metrics and writes them on exit (.prom for Prometheus text)
+    metrics_path = os.environ.get("MEDIA_SORTER_METRICS")
+    if metrics_path and metrics_path not in ("1", "true"):
+        atexit.register(metrics.export, metrics_path)
+
 def main():
     try:
         setup_environment()
+        setup_instrumentation()
         root = tk.Tk()
         try:
             if getattr(sys, 'frozen', False):
@@ -26,8 +35,14 @@ def main():
                 root.iconbitmap(icon_path)
         except Exception as e:
             print(f"Could not load application icon: {e}")
-        app = FileOrganizerGUI(root)
-        root.mainloop()
+        # MEDIA_SORTER_SCAN_SERVICE=http://127.0.0.1:8765 shares one scan_service between GUIs
+        app = FileOrganizerGUI(root, scan_service_url=os.environ.get("MEDIA_SORTER_SCAN_SERVICE"))
+        profile_prefix = os.environ.get("MEDIA_SORTER_PROFILE")
+        if profile_prefix:
+            with profile_run(profile_prefix, cpu=True, memory=True):
+                root.mainloop()
+        else:
+            root.mainloop()
     except Exception as e:
         tk.messagebox.showerror("Error", f"An error occurred: {str(e)}")
         raise
@@ -0,0 +1,262 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; covers a single stat() up to a multi-GB copy
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0
+)
+
+PROMETHEUS_PREFIX = "media_sorter_"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def merge(self, data: Dict):
+        """Add a histogram exported by to_dict() with the same buckets."""
+        previous = 0
+        for i, (_, running) in enumerate(data['buckets']):
+            self.counts[i] += running - previous
+            previous = running
+        self.count += data['count']
+        self.sum += data['sum']
+
+    def to_dict(self) -> Dict:
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            cumulative.append([bound, running])
+        return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.inc(f"{self.name}.errors")
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """
+    Process-wide counters, histograms and timing spans.
+    Every recording call is a no-op while disabled, so instrumented code
+    pays only an attribute check.
+    Worker processes (scan shards, decoders) record into their own copy and
+    send drain() back with each result; the parent merge()s it.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def inc(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def span(self, name: str):
+        """Context manager that records the elapsed time of its block under `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from `iterable`, recording the time spent producing each item."""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.observe(name, time.perf_counter() - start)
+                return
+            self.observe(name, time.perf_counter() - start)
+            yield item
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+
+    def drain(self) -> Dict:
+        """snapshot() and reset in one step, so each result carries only its own values."""
+        with self._lock:
+            snapshot = {
+                'counters': dict(self.counters),
+                'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+            }
+            self.counters.clear()
+            self.histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot: Dict):
+        """Add values recorded in another process."""
+        if not self.enabled or not snapshot:
+            return
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, data in snapshot['histograms'].items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.merge(data)
+
+    def to_prometheus(self) -> str:
+        """Render the current values in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = _prometheus_name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            metric = _prometheus_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in histogram['buckets']:
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{metric}_sum {histogram['sum']}")
+            lines.append(f"{metric}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def export_prometheus(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus())
+
+    def export(self, path: str):
+        """Write to `path`, choosing Prometheus text for .prom/.txt and JSON otherwise."""
+        try:
+            if path.endswith(('.prom', '.txt')):
+                self.export_prometheus(path)
+            else:
+                self.export_json(path)
+        except Exception as e:
+            logger.error(f"Error exporting metrics to {path}: {e}")
+
+
+def _prometheus_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+
+metrics = Metrics(enabled=bool(os.environ.get("MEDIA_SORTER_METRICS")))
+
+
+@contextmanager
+def profile_run(output_prefix: str, cpu: bool = True, memory: bool = False, top: int = 25):
+    """
+    Capture a cProfile and/or tracemalloc profile of the enclosed block.
+    Writes <prefix>.pstats (CPU) and <prefix>.memory.txt (top allocation sites).
+    """
+    profiler = cProfile.Profile() if cpu else None
+    started_tracemalloc = False
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracemalloc = True
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            try:
+                profiler.dump_stats(f"{output_prefix}.pstats")
+                with open(f"{output_prefix}.cpu.txt", 'w') as f:
+                    pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(top)
+            except Exception as e:
+                logger.error(f"Error writing CPU profile: {e}")
+        if memory:
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                with open(f"{output_prefix}.memory.txt", 'w') as f:
+                    f.write(f"current={current} peak={peak}\n")
+                    for stat in snapshot.statistics('lineno')[:top]:
+                        f.write(f"{stat}\n")
+            except Exception as e:
+                logger.error(f"Error writing memory profile: {e}")
+            finally:
+                if started_tracemalloc:
+                    tracemalloc.stop()
@@ -1,15 +1,19 @@
 import os
-from typing import Dict, List, Optional
-from utils import safe_copy_file, generate_unique_filename
+from typing import Dict, List, Optional, Tuple
+from utils import safe_copy_file, generate_unique_filename, copy_and_verify, get_hash_spec
+from metrics import metrics
 
 class FileOrganizer:
     def __init__(self):
         self.history: List[Dict] = []
         self.undo_stack: List[Dict] = []
         
-    def organize_file(self, file_info: Dict, destination: str, new_name: Optional[str] = None) -> Dict:
+    def organize_file(self, file_info: Dict, destination: str, new_name: Optional[str] = None,
+                      verify: bool = False) -> Dict:
         """
         Copy a file to its destination with optional renaming.
+        With verify, the content digest is computed during the copy, checked
+        against the scan-time hash when there is one, and stored in the action.
         Returns action dict for history tracking.
         """
         source_path = file_info['path']
@@ -20,7 +24,8 @@ class FileOrganizer:
             filename = os.path.basename(source_path)
             
         dest_path = os.path.join(destination, filename)
-        dest_path = generate_unique_filename(dest_path)
+        with metrics.span('organize.unique_name'):
+            dest_path = generate_unique_filename(dest_path)
         
         action = {
             'type': 'copy',
@@ -30,13 +35,35 @@ class FileOrganizer:
             'success': False
         }
         
-        if safe_copy_file(source_path, dest_path):
+        if verify:
+            hash_name, expected = get_hash_spec(file_info.get('metadata', {}))
+            copied = copy_and_verify(source_path, dest_path, hash_name, expected)
+            action.update({
+                'digest': copied['digest'],
+                'hash_algorithm': copied['hash_algorithm'],
+                'verified': copied['verified'],
+            })
+            success = copied['success']
+        else:
+            success = safe_copy_file(source_path, dest_path)
+        
+        if success:
             action['success'] = True
             self.history.append(action)
             self.undo_stack.clear()  # Clear redo stack when new action is performed
             
         return action
     
+    def organize_files(self, jobs: List[Tuple[Dict, str, Optional[str]]], verify: bool = False,
+                       **engine_options) -> List[Dict]:
+        """
+        Copy many files at once; jobs are (file_info, destination, new_name) tuples.
+        Uses AsyncOrganizeEngine so network round trips overlap. History is
+        recorded in job order. Returns one action dict per job.
+        """
+        from async_organizer import AsyncOrganizeEngine
+        return AsyncOrganizeEngine(self, verify=verify, **engine_options).organize_files(jobs)
+    
     def undo_last_action(self) -> Optional[Dict]:
         """Undo the last file operation."""
         if not self.history:
@@ -63,7 +90,13 @@ class FileOrganizer:
         action = self.undo_stack.pop()
         
         if action['type'] == 'copy':
-            if safe_copy_file(action['source'], action['destination']):
+            if action.get('digest'):
+                # Re-copy against the digest recorded the first time
+                success = copy_and_verify(action['source'], action['destination'],
+                                          action['hash_algorithm'], action['digest'])['success']
+            else:
+                success = safe_copy_file(action['source'], action['destination'])
+            if success:
                 self.history.append(action)
                 return action
             self.undo_stack.append(action)  # Put it back in undo stack if redo fails
@@ -0,0 +1,290 @@
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from metrics import metrics
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock timeout applies
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def _number_from_env(name: str, default: float) -> float:
+    """Positive number from an environment variable; a bad value is logged and the default used."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = 0
+    if not math.isfinite(number) or number <= 0:
+        logger.error(f"Ignoring invalid {name}={value!r}; using {default:g}")
+        return default
+    return number
+
+
+# Per-worker address-space budget on top of what the interpreter already uses
+DEFAULT_MEMORY_LIMIT = int(_number_from_env("MEDIA_SORTER_DECODE_MEMORY_MB", 1024) * 1024 * 1024)
+# Wall-clock (and CPU) seconds allowed per image
+DEFAULT_TIMEOUT = _number_from_env("MEDIA_SORTER_DECODE_TIMEOUT", 10)
+# Headers claiming more pixels than this are rejected without decoding
+MAX_DECODE_PIXELS = 1_000_000_000
+
+# Raw-encoded images are decoded in bands of about this many bytes
+BAND_BYTES = 16 * 1024 * 1024
+
+# Bytes per pixel for raw layouts that can be decoded band by band
+_RAW_PIXEL_BYTES = {
+    'L': 1, 'LA': 2, 'RGB': 3, 'BGR': 3,
+    'RGBA': 4, 'BGRA': 4, 'RGBX': 4, 'BGRX': 4, 'CMYK': 4,
+}
+
+# (mode, (width, height), raw pixel bytes) — cheap to pickle between processes
+DecodedImage = Tuple[str, Tuple[int, int], bytes]
+
+
+class DecodeFailure(Exception):
+    """An image could not be decoded within its limits."""
+
+
+def placeholder_image(size: Tuple[int, int], message: str = "Preview unavailable") -> Image.Image:
+    """Neutral stand-in shown in place of an image that failed to decode."""
+    img = Image.new('RGB', size, (43, 43, 43))
+    draw = ImageDraw.Draw(img)
+    left, top, right, bottom = draw.textbbox((0, 0), message)
+    draw.text(((size[0] - (right - left)) // 2, (size[1] - (bottom - top)) // 2), message, fill=(160, 160, 160))
+    return img
+
+
+def _fit(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    scale = min(max_size[0] / size[0], max_size[1] / size[1], 1.0)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _decode_bands(img: Image.Image, max_size: Tuple[int, int]) -> Optional[Image.Image]:
+    """Downscale an uncompressed image band by band; None if its layout isn't a single raw tile."""
+    if len(img.tile) != 1:
+        return None
+    codec, extents, offset, args = img.tile[0]
+    if codec != 'raw' or tuple(extents) != (0, 0) + img.size:
+        return None
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    pixel_bytes = _RAW_PIXEL_BYTES.get(rawmode)
+    if pixel_bytes is None or img.mode not in _RAW_PIXEL_BYTES or orientation not in (1, -1):
+        return None
+
+    width, height = img.size
+    stride = stride or width * pixel_bytes
+    out = Image.new(img.mode, _fit(img.size, max_size))
+    scale = out.height / height
+    out_rows = max(1, int(BAND_BYTES / stride * scale))
+    for out_top in range(0, out.height, out_rows):
+        out_bottom = min(out.height, out_top + out_rows)
+        top = int(out_top / scale)
+        bottom = height if out_bottom == out.height else int(out_bottom / scale)
+        # Bottom-up files (BMP) store image row y at file row height - 1 - y
+        first_row = top if orientation == 1 else height - bottom
+        img.fp.seek(offset + first_row * stride)
+        data = img.fp.read((bottom - top) * stride)
+        band = Image.frombytes(img.mode, (width, bottom - top), data, 'raw', rawmode, stride, orientation)
+        out.paste(band.resize((out.width, out_bottom - out_top), Image.Resampling.BOX), (0, out_top))
+    return out
+
+
+def open_downscaled(path: str, max_size: Tuple[int, int]) -> Image.Image:
+    """
+    Decode an image at no more than max_size without ever holding the full
+    image when it can be avoided: JPEG decodes at reduced scale, raw layouts
+    (TIFF, BMP, PPM) band by band. Other formats decode in full, so call this
+    in a limited worker (see SafeDecoder).
+    """
+    with warnings.catch_warnings():
+        # The explicit pixel check below replaces Pillow's warning
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        img = Image.open(path)
+    if img.width * img.height > MAX_DECODE_PIXELS:
+        img.close()
+        raise DecodeFailure(f"{img.width}x{img.height} exceeds the decode limit")
+    img.draft('RGB', max_size)
+    banded = _decode_bands(img, max_size)
+    if banded is not None:
+        img.close()
+        return banded
+    img.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return img
+
+
+def decode_image(path: str, max_size: Tuple[int, int]) -> DecodedImage:
+    img = open_downscaled(path, max_size)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img.mode, img.size, img.tobytes()
+
+
+def _address_space() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _cpu_limit_exceeded(signum, frame):
+    raise DecodeFailure("CPU limit exceeded")
+
+
+def _init_worker(memory_limit: int, collect_metrics: bool = False):
+    # Inside the memory-limited worker Pillow's bomb check moves up to our own limit;
+    # every other process keeps Pillow's default
+    Image.MAX_IMAGE_PIXELS = MAX_DECODE_PIXELS
+    if collect_metrics:
+        metrics.enable()
+    if resource is None:
+        return
+    # SIGXCPU fails only the running task instead of killing the worker (and every task on the pool)
+    signal.signal(signal.SIGXCPU, _cpu_limit_exceeded)
+    if not memory_limit:
+        return
+    try:
+        limit = _address_space() + memory_limit
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        logger.warning(f"Could not set decode memory limit: {e}")
+
+
+def _set_cpu_limit(soft: Optional[int]):
+    """Set the soft CPU limit; None lifts it back to the hard limit."""
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if soft is None:
+            soft = hard
+        if hard == resource.RLIM_INFINITY or soft <= hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _run_limited(cpu_seconds: float, func, *args) -> Tuple[object, Optional[Dict]]:
+    """(func(*args), the task's drained metrics or None when metrics are off)."""
+    # The soft CPU limit is raised per task; a runaway decode gets SIGXCPU, which fails the task
+    limited = resource is not None and cpu_seconds
+    if limited:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _set_cpu_limit(int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1)
+    try:
+        return func(*args), metrics.drain() if metrics.enabled else None
+    except MemoryError:
+        raise DecodeFailure("memory limit exceeded")
+    finally:
+        if limited:
+            # Otherwise an idle worker past its limit keeps getting SIGXCPU
+            _set_cpu_limit(None)
+
+
+class SafeDecoder:
+    """
+    Runs image decoding in worker processes with a per-worker memory limit
+    and per-task CPU and wall-clock limits. A task that runs out of memory,
+    CPU time or wall-clock time fails with a DecodeFailure to show as a
+    placeholder; a hung worker is killed and the pool rebuilt.
+    At most `processes` tasks are submitted at once, so each task starts as
+    soon as it is submitted and its timeout covers only its own decode.
+    The pool is started on first use.
+    """
+
+    def __init__(self, processes: Optional[int] = None, memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.processes = processes or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.processes)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: never fork the Tk process and its threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit, metrics.enabled)
+                )
+            return self._pool
+
+    def _recycle(self, pool: ProcessPoolExecutor, kill: bool = False):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if kill:
+            # A hung worker never returns on its own; executor offers no per-task cancel
+            for process in list(getattr(pool, '_processes', {}).values()):
+                process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def call(self, func, *args, timeout: Optional[float] = None):
+        """Blocking: run func(*args) in a limited worker. Raises DecodeFailure."""
+        timeout = timeout or self.timeout
+        for attempt in range(2):
+            with self._slots:
+                pool = self._get_pool()
+                try:
+                    result, task_metrics = pool.submit(_run_limited, timeout, func, *args).result(timeout=timeout)
+                    metrics.merge(task_metrics)
+                    return result
+                except FutureTimeoutError:
+                    # Never retried: the same file would hang again
+                    metrics.inc('decode.timeouts')
+                    self._recycle(pool, kill=True)
+                    raise DecodeFailure(f"timed out after {timeout:.0f}s")
+                except BrokenProcessPool:
+                    # Own limits fail the task in the worker, so this task is most likely
+                    # collateral of another task's hang or crash on the same pool: retry once
+                    metrics.inc('decode.worker_crashes')
+                    self._recycle(pool)
+                    if attempt:
+                        raise DecodeFailure("decoder process crashed")
+                except DecodeFailure:
+                    raise
+                except Exception as e:
+                    raise DecodeFailure(str(e)) from e
+
+    def decode(self, path: str, max_size: Tuple[int, int]) -> DecodedImage:
+        """Blocking: decode path to at most max_size. Raises DecodeFailure."""
+        start = time.perf_counter()
+        try:
+            return self.call(decode_image, path, tuple(max_size))
+        except DecodeFailure:
+            metrics.inc('decode.failures')
+            raise
+        finally:
+            metrics.observe('decode', time.perf_counter() - start)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+decoder = SafeDecoder()
@@ -0,0 +1,184 @@
+import logging
+import os
+import re
+import time
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+# gitignore-style pattern file read from the top of each scan root
+IGNORE_FILENAME = ".mediasorterignore"
+
+# Windows paths compare case-insensitively
+_FLAGS = re.IGNORECASE if os.name == 'nt' else 0
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore glob into a regex body for '/'-separated relative paths."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            out.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif c == '*':
+            out.append('[^/]*')
+            i += 1
+        elif c == '?':
+            out.append('[^/]')
+            i += 1
+        elif c == '[' and pattern.find(']', i + 1) != -1:
+            j = pattern.find(']', i + 1)
+            body = pattern[i + 1:j]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append('[' + body.replace('\\', '\\\\') + ']')
+            i = j + 1
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return ''.join(out)
+
+
+def compile_pattern(pattern: str) -> Optional[Tuple[Pattern, bool, bool]]:
+    """
+    Compile one gitignore-style line.
+    Returns:
+        (regex, directories_only, negated), or None for blank lines and comments
+    """
+    pattern = pattern.rstrip('\n').rstrip()
+    if not pattern or pattern.startswith('#'):
+        return None
+    negated = pattern.startswith('!')
+    if negated:
+        pattern = pattern[1:]
+    directories_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    # A slash anywhere but the end anchors the pattern to the scan root
+    anchored = '/' in pattern
+    body = _translate(pattern.lstrip('/'))
+    regex = f"^{body}$" if anchored else f"^(?:.*/)?{body}$"
+    return re.compile(regex, _FLAGS), directories_only, negated
+
+
+def read_ignore_file(path: str) -> List[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        logger.error(f"Error reading {path}: {e}")
+        return []
+
+
+class ScanRules:
+    """
+    Include/exclude patterns (gitignore syntax) plus size, age and depth
+    limits for a scan. Patterns are compiled once. Directories are checked
+    before they are listed, so an excluded subtree is never read or stat'd.
+    - exclude: gitignore lines; later lines win, '!' re-includes, a trailing
+      '/' matches directories only, a leading or inner '/' anchors to the root
+    - include: if given, only files matching one of these are kept
+    - min_size / max_size: bytes
+    - max_age_days: skip files modified longer ago than this
+    - min_age_days: skip files modified more recently (e.g. still being written)
+    - max_depth: deepest directory level walked; 0 keeps only files in the root
+    Age limits are measured from when the rules were created; for_root()
+    makes a fresh copy per scan.
+    """
+
+    def __init__(self, exclude: Iterable[str] = (), include: Iterable[str] = (),
+                 min_size: Optional[int] = None, max_size: Optional[int] = None,
+                 max_age_days: Optional[float] = None, min_age_days: Optional[float] = None,
+                 max_depth: Optional[int] = None):
+        self.exclude = list(exclude)
+        self.include = list(include)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age_days = max_age_days
+        self.min_age_days = min_age_days
+        self.max_depth = max_depth
+
+        self._excludes = [rule for rule in map(compile_pattern, self.exclude) if rule]
+        self._includes = [rule[0] for rule in map(compile_pattern, self.include) if rule]
+        # Without negations, one combined regex per target type answers in a single match
+        self._ordered = any(negated for _, _, negated in self._excludes)
+        self._dir_regex = self._combine(rule[0] for rule in self._excludes)
+        self._file_regex = self._combine(regex for regex, directories_only, _ in self._excludes if not directories_only)
+        self._include_regex = self._combine(self._includes)
+
+        now = time.time()
+        self._modified_after = now - max_age_days * 86400 if max_age_days is not None else None
+        self._modified_before = now - min_age_days * 86400 if min_age_days is not None else None
+        self._checks_stat = any(limit is not None for limit in (
+            min_size, max_size, self._modified_after, self._modified_before
+        ))
+
+    @staticmethod
+    def _combine(regexes: Iterable[Pattern]) -> Optional[Pattern]:
+        bodies = [regex.pattern for regex in regexes]
+        return re.compile('|'.join(f"(?:{body})" for body in bodies), _FLAGS) if bodies else None
+
+    @property
+    def active(self) -> bool:
+        return bool(self._excludes or self._includes or self._checks_stat or self.max_depth is not None)
+
+    def for_root(self, root: str) -> 'ScanRules':
+        """These rules plus the root's own ignore file, with age limits measured from now."""
+        return ScanRules(
+            self.exclude + read_ignore_file(os.path.join(root, IGNORE_FILENAME)),
+            self.include,
+            self.min_size,
+            self.max_size,
+            self.max_age_days,
+            self.min_age_days,
+            self.max_depth
+        )
+
+    def _excluded(self, relative_path: str, is_dir: bool) -> bool:
+        if not self._ordered:
+            regex = self._dir_regex if is_dir else self._file_regex
+            return bool(regex and regex.match(relative_path))
+        excluded = False
+        for regex, directories_only, negated in self._excludes:
+            if directories_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                excluded = not negated
+        return excluded
+
+    def exclude_dir(self, relative_path: str, depth: int) -> bool:
+        """True if a directory (path relative to the root, '/'-separated) should not be walked."""
+        if self.max_depth is not None and depth > self.max_depth:
+            return True
+        return self._excluded(relative_path, True)
+
+    def exclude_file(self, relative_path: str, entry: os.DirEntry) -> bool:
+        """True if a file should be skipped. Only stats the entry when a size or age limit is set."""
+        if self._excluded(relative_path, False):
+            return True
+        if self._include_regex and not self._include_regex.match(relative_path):
+            return True
+        if not self._checks_stat:
+            return False
+        file_stat = entry.stat()
+        if self.min_size is not None and file_stat.st_size < self.min_size:
+            return True
+        if self.max_size is not None and file_stat.st_size > self.max_size:
+            return True
+        if self._modified_after is not None and file_stat.st_mtime < self._modified_after:
+            return True
+        if self._modified_before is not None and file_stat.st_mtime > self._modified_before:
+            return True
+        return False
@@ -0,0 +1,324 @@
+import argparse
+import http.client
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from scanner import FileScanner, DEFAULT_WORKERS_PER_DEVICE
+from video_probe import VideoProber, DEFAULT_PROBE_WORKERS
+from snapshot import MAGIC, END_OF_RECORDS, KEEPALIVE, encode_record, iter_records
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# A batch is a whole top-level subtree and can take minutes; the stream sends a
+# keepalive frame this often so clients can tell a slow scan from a dead one
+KEEPALIVE_INTERVAL = 5.0
+# Finished scans older than this are rescanned on the next request
+DEFAULT_JOB_TTL = 15 * 60
+# Finished scans kept in memory; the oldest are dropped beyond this
+DEFAULT_MAX_JOBS = 16
+
+
+class ScanCancelled(Exception):
+    """A client scan was cancelled before the stream ended."""
+
+
+class _ScanJob:
+    """One cached scan. Subscribers read its records while it is still running."""
+
+    def __init__(self, roots: Tuple[str, ...], extensions: Optional[Tuple[str, ...]]):
+        self.roots = roots
+        self.extensions = extensions
+        self.records: List[Dict] = []
+        self.done = False
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self._condition = threading.Condition()
+
+    def add_batch(self, batch: List[Dict]):
+        with self._condition:
+            self.records.extend(batch)
+            self._condition.notify_all()
+
+    def finish(self, records: List[Dict]):
+        with self._condition:
+            # Replace with the scanner's final list so background hash updates stay shared
+            self.records = records
+            self.done = True
+            self.finished = time.time()
+            self._condition.notify_all()
+
+    def read_from(self, index: int, timeout: float = KEEPALIVE_INTERVAL) -> Tuple[List[Dict], bool]:
+        """Wait up to `timeout` for records past `index` or the end of the scan."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while index >= len(self.records) and not self.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self.records[index:], self.done
+    
+    def expired(self, ttl: float) -> bool:
+        return self.done and ttl > 0 and time.time() - self.finished > ttl
+
+    def status(self) -> Dict:
+        return {
+            'roots': list(self.roots),
+            'extensions': list(self.extensions) if self.extensions else None,
+            'records': len(self.records),
+            'done': self.done,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class ScanService:
+    """
+    Owns the scan cache and worker pools for every client on this machine,
+    so each share is walked, hashed and probed once no matter how many
+    operators are looking at it.
+    """
+
+    def __init__(self, workers_per_device: int = DEFAULT_WORKERS_PER_DEVICE,
+                 processes: int = 0, background_hasher=None,
+                 video_prober: Optional[VideoProber] = None, job_ttl: float = DEFAULT_JOB_TTL,
+                 max_jobs: int = DEFAULT_MAX_JOBS):
+        self.workers_per_device = workers_per_device
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.processes = processes
+        self.background_hasher = background_hasher
+        self.video_prober = video_prober
+        self._jobs: Dict[Tuple, _ScanJob] = {}
+        self._lock = threading.Lock()
+
+    def get_job(self, roots: List[str], extensions: Optional[List[str]] = None,
+                refresh: bool = False) -> _ScanJob:
+        """
+        Return the cached scan for these roots, starting it if needed.
+        A finished scan is redone if refresh is set or it is older than job_ttl.
+        """
+        key = (tuple(roots), tuple(extensions) if extensions else None)
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(key)
+            if job and not (refresh and job.done):
+                return job
+            job = self._jobs[key] = _ScanJob(*key)
+        threading.Thread(target=self._run, args=(job,), name="ScanServiceJob", daemon=True).start()
+        return job
+
+    def _evict(self):
+        """Drop expired scans, then the oldest finished ones beyond max_jobs. Call with the lock held."""
+        for key in [key for key, job in self._jobs.items() if job.expired(self.job_ttl)]:
+            del self._jobs[key]
+        finished = sorted((job.finished, key) for key, job in self._jobs.items() if job.done)
+        for _, key in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[key]
+
+    def _run(self, job: _ScanJob):
+        scanner = FileScanner(background_hasher=self.background_hasher, video_prober=self.video_prober)
+        try:
+            records = scanner.scan_directories(
+                list(job.roots),
+                list(job.extensions) if job.extensions else None,
+                workers_per_device=self.workers_per_device,
+                processes=self.processes,
+                on_batch=job.add_batch,
+            ) or job.records
+        except Exception as e:
+            logger.error(f"Error scanning {job.roots}: {e}")
+            records = job.records
+        job.finish(records)
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [job.status() for job in self._jobs.values()]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: ScanService = None
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        if url.path == '/scan':
+            self._stream_scan(params)
+        elif url.path == '/status':
+            body = json.dumps(self.service.status()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def _stream_scan(self, params: Dict[str, List[str]]):
+        roots = params.get('root')
+        if not roots:
+            self.send_error(400, "At least one root is required")
+            return
+        job = self.service.get_job(roots, params.get('ext'), refresh=params.get('refresh') == ['1'])
+
+        # Body is the snapshot record stream, flushed batch by batch
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        try:
+            self.wfile.write(MAGIC)
+            index = 0
+            while True:
+                batch, done = job.read_from(index)
+                if batch:
+                    self.wfile.write(b"".join(encode_record(r) for r in batch))
+                    index += len(batch)
+                elif not done:
+                    self.wfile.write(KEEPALIVE)
+                self.wfile.flush()
+                if done:
+                    break
+            self.wfile.write(END_OF_RECORDS)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled; the scan itself carries on for other clients
+            logger.debug(f"Client {self.address_string()} disconnected from scan of {roots}")
+
+
+def serve(service: ScanService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Create the HTTP server; call serve_forever() on the result."""
+    handler = type('ScanServiceHandler', (_Handler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class _CancellableStream:
+    """Response wrapper checked on every frame read, keepalives included."""
+
+    def __init__(self, stream, cancel_event: threading.Event):
+        self.stream = stream
+        self.cancel_event = cancel_event
+
+    def read(self, size: int) -> bytes:
+        if self.cancel_event.is_set():
+            raise ScanCancelled()
+        return self.stream.read(size)
+
+
+class ScanServiceClient:
+    """Fetches scans from a running scan service instead of scanning locally."""
+
+    def __init__(self, url: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 30.0,
+                 stream_timeout: Optional[float] = None):
+        """
+        Args:
+            url: Base URL of the service
+            timeout: Seconds allowed to connect and receive the response headers
+            stream_timeout: Seconds allowed between reads of a scan stream; None
+                waits as long as the scan takes (the service sends keepalives)
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+
+    def scan_directories(self, directories: List[str], extensions: List[str] = None,
+                         refresh: bool = False,
+                         on_batch: Optional[Callable[[List[Dict]], None]] = None,
+                         batch_size: int = 500,
+                         cancel_event: Optional[threading.Event] = None) -> List[Dict]:
+        """
+        Stream a scan from the service. Setting cancel_event closes the
+        connection within one keepalive interval and returns an empty list.
+        """
+        query = [('root', d) for d in directories]
+        query += [('ext', e) for e in extensions or []]
+        if refresh:
+            query.append(('refresh', '1'))
+        target = urllib.parse.urlsplit(self.url)
+
+        records: List[Dict] = []
+        batch: List[Dict] = []
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=self.timeout)
+        try:
+            connection.request('GET', f"{target.path}/scan?{urllib.parse.urlencode(query)}")
+            sock = connection.sock  # The response takes it over once the headers are read
+            response = connection.getresponse()
+            if response.status != 200:
+                raise OSError(f"Scan service returned {response.status} {response.reason}")
+            # The connect/header timeout must not cut off a long scan mid-stream
+            sock.settimeout(self.stream_timeout)
+            stream = _CancellableStream(response, cancel_event) if cancel_event else response
+            for record in iter_records(stream):
+                records.append(record)
+                if on_batch:
+                    batch.append(record)
+                    if len(batch) >= batch_size:
+                        on_batch(batch)
+                        batch = []
+        except ScanCancelled:
+            logger.info(f"Scan of {directories} from {self.url} cancelled")
+            return []
+        finally:
+            connection.close()
+        if on_batch and batch:
+            on_batch(batch)
+        return records
+
+    def scan_directory(self, directory: str, extensions: List[str] = None, refresh: bool = False,
+                       cancel_event: Optional[threading.Event] = None) -> List[Dict]:
+        return self.scan_directories([directory], extensions, refresh, cancel_event=cancel_event)
+
+    def status(self) -> List[Dict]:
+        with urllib.request.urlopen(f"{self.url}/status", timeout=self.timeout) as response:
+            return json.load(response)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Shared scan and metadata service for Media File Sorter")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers-per-device', type=int, default=DEFAULT_WORKERS_PER_DEVICE)
+    parser.add_argument('--processes', type=int, default=0, help="Split each scan across this many processes")
+    parser.add_argument('--no-background-hash', action='store_true', help="Skip full hashing of large files")
+    parser.add_argument('--job-ttl', type=float, default=DEFAULT_JOB_TTL,
+                        help="Seconds before a finished scan is redone on request (0 keeps it forever)")
+    parser.add_argument('--max-jobs', type=int, default=DEFAULT_MAX_JOBS,
+                        help="Finished scans kept in memory")
+    parser.add_argument('--probe-workers', type=int, default=DEFAULT_PROBE_WORKERS,
+                        help="Concurrent video probes per scan (0 disables probing)")
+    args = parser.parse_args(argv)
+
+    background_hasher = None
+    if not args.no_background_hash:
+        from hasher import BackgroundHasher
+        background_hasher = BackgroundHasher()
+        background_hasher.start()
+
+    video_prober = VideoProber(workers=args.probe_workers) if args.probe_workers > 0 else None
+    service = ScanService(args.workers_per_device, args.processes, background_hasher, video_prober, args.job_ttl,
+                          args.max_jobs)
+    server = serve(service, args.host, args.port)
+    logger.info(f"Scan service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if background_hasher:
+            background_hasher.stop()
+
+
+if __name__ == "__main__":
+    main()
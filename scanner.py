@@ -1,80 +1,368 @@
 from pathlib import Path
-from typing import List, Dict
+from collections import deque
+from typing import Callable, List, Dict, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
 from utils import get_file_metadata
+from video_probe import VideoProber
+from scan_rules import ScanRules
+from snapshot import write_snapshot, load_snapshot
+from metrics import metrics
 import logging
+import multiprocessing
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WORKERS_PER_DEVICE = 2
+
+def _inode_key(file_stat: os.stat_result, path: str) -> Tuple[int, int]:
+    # DirEntry.stat() reports st_ino == 0 on Windows; a full stat fills it in
+    if not file_stat.st_ino:
+        file_stat = os.stat(path)
+    return (file_stat.st_dev, file_stat.st_ino)
+
+class _ScanState:
+    """Shared bookkeeping for the shards of one scan."""
+    
+    def __init__(self, cancel_event: Optional[threading.Event] = None):
+        self._lock = threading.Lock()
+        self._cancel_event = cancel_event
+        self._seen: Set[Tuple[int, int]] = set()
+        self.total_files = 0
+        self.errors = 0
+        self.duplicates = 0
+        self.pruned_dirs = 0  # Excluded by ScanRules before being listed
+        self.skipped_files = 0  # Excluded by ScanRules patterns or limits
+    
+    def claim(self, key: Tuple[int, int]) -> bool:
+        """Return True the first time a (st_dev, st_ino) pair is seen."""
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            return True
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event is not None and self._cancel_event.is_set()
+    
+    def add(self, total_files: int = 0, errors: int = 0, duplicates: int = 0,
+            pruned_dirs: int = 0, skipped_files: int = 0):
+        with self._lock:
+            self.total_files += total_files
+            self.errors += errors
+            self.duplicates += duplicates
+            self.pruned_dirs += pruned_dirs
+            self.skipped_files += skipped_files
+
+def scan_shard(root: str, directory: str, recursive: bool,
+               extensions: Optional[List[str]] = None,
+               rules: Optional[ScanRules] = None,
+               collect_metrics: bool = False) -> Tuple[List[Dict], int, int, int, int, Optional[Dict]]:
+    """
+    Scan one shard in a worker process.
+    Returns (records, total_files, errors, pruned_dirs, skipped_files, metrics),
+    where metrics is the shard's drained metrics if collect_metrics is set.
+    """
+    if collect_metrics:
+        metrics.enable()
+    state = _ScanState()
+    records = FileScanner()._scan_shard(root, directory, recursive, extensions, state, rules)
+    return (records, state.total_files, state.errors, state.pruned_dirs, state.skipped_files,
+            metrics.drain() if collect_metrics else None)
+
 class FileScanner:
-    def __init__(self):
+    def __init__(self, background_hasher=None, video_prober: Optional[VideoProber] = None):
         self.scanned_files: List[Dict] = []
         self.file_history: List[Dict] = []  # For undo/redo functionality
+        self.background_hasher = background_hasher  # Full hashes for files above LARGE_FILE_THRESHOLD
+        self.video_prober = video_prober  # Duration, resolution, codec and fps for videos
         
-    def scan_directory(self, directory: str, extensions: List[str] = None) -> List[Dict]:
+    def scan_directory(self, directory: str, extensions: List[str] = None,
+                       rules: Optional[ScanRules] = None,
+                       cancel_event: Optional[threading.Event] = None) -> List[Dict]:
         """
         Recursively scan directory for files.
         Args:
             directory: Root directory to scan
             extensions: List of file extensions to include (e.g., ['.jpg', '.png'])
+            rules: Exclusion patterns and size/age/depth limits
+            cancel_event: Set it to stop the scan early
+        Returns:
+            List of dictionaries containing file information
+        """
+        return self.scan_directories([directory], extensions, rules=rules, cancel_event=cancel_event)
+    
+    def scan_directories(self, directories: List[str], extensions: List[str] = None,
+                         workers_per_device: int = DEFAULT_WORKERS_PER_DEVICE,
+                         processes: int = 0,
+                         on_batch: Optional[Callable[[List[Dict]], None]] = None,
+                         rules: Optional[ScanRules] = None,
+                         cancel_event: Optional[threading.Event] = None) -> List[Dict]:
+        """
+        Scan several root directories concurrently into one merged result set.
+        Each root is split into shards (its top-level files, plus one shard per
+        subdirectory). Shards run on a separate thread pool per device, so a
+        slow mount only uses its own workers and cannot starve the others.
+        Files and directories are tracked by (st_dev, st_ino), so hardlinks and
+        overlapping roots are listed and hashed only once.
+        Videos are probed by the video_prober, if set, on its own bounded pool
+        while the walk continues; a batch is delivered once its probes finish.
+        With processes > 1 the shards are split between worker processes
+        instead (spawned, not forked); overlapping directories may then be
+        walked twice, but each file is still recorded once, and
+        workers_per_device no longer applies: all devices share the processes.
+        Shards are delivered in the order they finish, not submission order.
+        Each root's rules are the given rules plus the root's .mediasorterignore
+        file; excluded directories are pruned before they are listed.
+        Setting cancel_event stops the walk between directories; a cancelled
+        scan skips background hashing and returns an empty list.
+        Args:
+            directories: Root directories to scan
+            extensions: List of file extensions to include (e.g., ['.jpg', '.png'])
+            workers_per_device: Scanning threads per storage device
+            processes: Number of worker processes (0 or 1 scans in-process)
+            on_batch: Called with each shard's records as soon as they are ready
+            rules: Exclusion patterns and size/age/depth limits
+            cancel_event: Set it to stop the scan early
         Returns:
             List of dictionaries containing file information
         """
         try:
             self.scanned_files.clear()
-            root_path = Path(directory)
+            start = time.perf_counter()
+            state = _ScanState(cancel_event)
             
-            # Validate directory
-            if not root_path.exists():
-                logger.error(f"Directory does not exist: {directory}")
-                return []
+            # Group shards by the device their root lives on
+            shards_by_device: Dict[int, List[Tuple[str, str, bool]]] = {}
+            rules_by_root: Dict[str, Optional[ScanRules]] = {}
+            for directory in directories:
+                root_path = Path(directory)
+                
+                # Validate directory
+                if not root_path.exists():
+                    logger.error(f"Directory does not exist: {directory}")
+                    continue
+                
+                if not root_path.is_dir():
+                    logger.error(f"Path is not a directory: {directory}")
+                    continue
+                
+                root_rules = (rules or ScanRules()).for_root(str(root_path))
+                rules_by_root[str(root_path)] = root_rules if root_rules.active else None
+                device = os.stat(directory).st_dev
+                shards_by_device.setdefault(device, []).extend(
+                    self._shard_root(str(root_path), rules_by_root[str(root_path)], state)
+                )
             
-            if not root_path.is_dir():
-                logger.error(f"Path is not a directory: {directory}")
-                return []
+            probe_pool = ThreadPoolExecutor(max_workers=self.video_prober.workers,
+                                            thread_name_prefix="video-probe") if self.video_prober else None
+            probing = deque()  # (batch, probe futures), delivered as their probes finish
+            
+            def deliver(wait_for_probes: bool = False):
+                for item in list(probing):
+                    batch, futures = item
+                    if wait_for_probes:
+                        wait(futures)
+                    elif not all(f.done() for f in futures):
+                        continue
+                    probing.remove(item)
+                    self.scanned_files.extend(batch)
+                    if on_batch:
+                        on_batch(batch)
             
-            # Scan files
-            total_files = 0
-            errors = 0
+            def collect(batch: List[Dict]):
+                if not batch:
+                    return
+                probing.append((batch, self.video_prober.submit(probe_pool, batch) if probe_pool else []))
+                deliver()
             
-            for file_path in root_path.rglob('*'):
+            if processes > 1:
+                self._scan_in_processes(shards_by_device, extensions, rules_by_root, processes, state, collect)
+            else:
+                pools = {
+                    device: ThreadPoolExecutor(max_workers=max(1, workers_per_device),
+                                               thread_name_prefix=f"scan-{device}")
+                    for device in shards_by_device
+                }
                 try:
-                    if file_path.is_file():
-                        total_files += 1
-                        
-                        # Skip files that match extension filter
-                        if extensions and file_path.suffix.lower() not in extensions:
-                            continue
-                        
-                        # Skip system files and hidden files
-                        if file_path.name.startswith('.') or file_path.name.startswith('~$'):
-                            continue
-                            
-                        try:
-                            metadata = get_file_metadata(str(file_path))
-                        except Exception as e:
-                            logger.error(f"Error getting metadata for {file_path}: {e}")
-                            errors += 1
-                            continue
-                            
-                        file_info = {
-                            'path': str(file_path),
-                            'relative_path': str(file_path.relative_to(root_path)),
-                            'metadata': metadata
-                        }
-                        self.scanned_files.append(file_info)
-                        
-                except Exception as e:
-                    logger.error(f"Error processing file {file_path}: {e}")
-                    errors += 1
-                    continue
-                    
-            logger.info(f"Scanned {total_files} files, {len(self.scanned_files)} processed, {errors} errors")
+                    futures = [
+                        pools[device].submit(self._scan_shard, root, shard, recursive, extensions, state,
+                                             rules_by_root[root])
+                        for device, shards in shards_by_device.items()
+                        for root, shard, recursive in shards
+                    ]
+                    # Completion order: a slow mount's shards never hold back finished ones
+                    for future in as_completed(futures):
+                        collect(future.result())
+                finally:
+                    for pool in pools.values():
+                        pool.shutdown(wait=True)
+            
+            try:
+                if not state.cancelled:
+                    deliver(wait_for_probes=True)
+            finally:
+                if probe_pool:
+                    probe_pool.shutdown(wait=True, cancel_futures=state.cancelled)
+                    self.video_prober.cache.save()
+            
+            if state.cancelled:
+                logger.info(f"Scan of {directories} cancelled")
+                return []
+            
+            if self.background_hasher:
+                for file_info in self.scanned_files:
+                    if file_info['metadata'].get('hash') == 'large_file':
+                        self.background_hasher.submit(file_info)
+            
+            metrics.observe('scan', time.perf_counter() - start)
+            metrics.inc('scan.files', state.total_files)
+            metrics.inc('scan.errors', state.errors)
+            metrics.inc('scan.duplicate_inodes', state.duplicates)
+            metrics.inc('scan.pruned_dirs', state.pruned_dirs)
+            metrics.inc('scan.rule_skipped_files', state.skipped_files)
+            logger.info(
+                f"Scanned {state.total_files} files in {len(directories)} roots, "
+                f"{len(self.scanned_files)} processed, {state.duplicates} hardlinks/overlaps skipped, "
+                f"{state.pruned_dirs} directories pruned, {state.skipped_files} files excluded by rules, "
+                f"{state.errors} errors"
+            )
             return self.scanned_files
             
         except Exception as e:
-            logger.error(f"Error scanning directory {directory}: {e}")
+            logger.error(f"Error scanning directories {directories}: {e}")
             return []
     
+    def _scan_in_processes(self, shards_by_device: Dict[int, List[Tuple[str, str, bool]]],
+                           extensions: Optional[List[str]], rules_by_root: Dict[str, Optional[ScanRules]],
+                           processes: int, state: '_ScanState', collect: Callable[[List[Dict]], None]):
+        # spawn: the scan service and GUI already run threads, which fork would copy mid-state
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [
+                pool.submit(scan_shard, root, shard, recursive, extensions, rules_by_root[root], metrics.enabled)
+                for shards in shards_by_device.values()
+                for root, shard, recursive in shards
+            ]
+            for future in as_completed(futures):
+                if state.cancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    return
+                records, total_files, errors, pruned_dirs, skipped_files, shard_metrics = future.result()
+                metrics.merge(shard_metrics)
+                state.add(total_files=total_files, errors=errors,
+                          pruned_dirs=pruned_dirs, skipped_files=skipped_files)
+                
+                # Workers dedupe only within themselves; drop files another worker already reported
+                batch = []
+                for file_info in records:
+                    try:
+                        key = _inode_key(os.stat(file_info['path']), file_info['path'])
+                    except OSError:
+                        key = None
+                    if key is None or state.claim(key):
+                        batch.append(file_info)
+                    else:
+                        state.add(duplicates=1)
+                collect(batch)
+    
+    def _shard_root(self, root: str, rules: Optional[ScanRules] = None,
+                    state: Optional['_ScanState'] = None) -> List[Tuple[str, str, bool]]:
+        """Split a root into (root, directory, recursive) work items."""
+        shards = [(root, root, False)]
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rules and rules.exclude_dir(entry.name, 1):
+                            if state:
+                                state.add(pruned_dirs=1)
+                            continue
+                        shards.append((root, entry.path, True))
+        except OSError as e:
+            logger.error(f"Error listing {root}: {e}")
+        return shards
+    
+    def _scan_shard(self, root: str, directory: str, recursive: bool,
+                    extensions: Optional[List[str]], state: '_ScanState',
+                    rules: Optional[ScanRules] = None) -> List[Dict]:
+        records: List[Dict] = []
+        # (path, '/'-separated path relative to root, depth below root) for rule matching
+        relative = os.path.relpath(directory, root).replace(os.sep, '/')
+        relative = '' if relative == '.' else relative
+        stack = [(directory, relative, relative.count('/') + 1 if relative else 0)]
+        
+        while stack and not state.cancelled:
+            current, current_relative, depth = stack.pop()
+            try:
+                if not state.claim(_inode_key(os.stat(current), current)):
+                    continue
+                with metrics.span('scan.walk'):
+                    with os.scandir(current) as it:
+                        entries = list(it)
+            except OSError as e:
+                logger.error(f"Error listing directory {current}: {e}")
+                state.add(errors=1)
+                continue
+            
+            for entry in entries:
+                try:
+                    entry_relative = f"{current_relative}/{entry.name}" if current_relative else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            # Pruned here, so an excluded subtree is never listed
+                            if rules and rules.exclude_dir(entry_relative, depth + 1):
+                                state.add(pruned_dirs=1)
+                                continue
+                            stack.append((entry.path, entry_relative, depth + 1))
+                        continue
+                    
+                    if not entry.is_file():
+                        continue
+                    state.add(total_files=1)
+                    
+                    # Skip files that match extension filter
+                    if extensions and os.path.splitext(entry.name)[1].lower() not in extensions:
+                        continue
+                    
+                    # Skip system files and hidden files
+                    if entry.name.startswith('.') or entry.name.startswith('~$'):
+                        continue
+                    
+                    if rules and rules.exclude_file(entry_relative, entry):
+                        state.add(skipped_files=1)
+                        continue
+                    
+                    with metrics.span('scan.stat'):
+                        key = _inode_key(entry.stat(), entry.path)
+                    if not state.claim(key):
+                        state.add(duplicates=1)
+                        continue
+                    
+                    try:
+                        metadata = get_file_metadata(entry.path)
+                    except Exception as e:
+                        logger.error(f"Error getting metadata for {entry.path}: {e}")
+                        state.add(errors=1)
+                        continue
+                    
+                    records.append({
+                        'path': entry.path,
+                        'root': root,
+                        'relative_path': os.path.relpath(entry.path, root),
+                        'metadata': metadata
+                    })
+                    
+                except Exception as e:
+                    logger.error(f"Error processing file {entry.path}: {e}")
+                    state.add(errors=1)
+                    continue
+        
+        return records
+    
     def filter_files(self, keyword: str = None, extension: str = None) -> List[Dict]:
         """Filter scanned files based on keyword and/or extension."""
         try:
@@ -100,6 +388,30 @@ class FileScanner:
             logger.error(f"Error filtering files: {e}")
             return []
     
+    def export_snapshot(self, path: str) -> bool:
+        """Write the scanned records to a binary snapshot file (see snapshot.py)."""
+        try:
+            count = write_snapshot(path, self.scanned_files)
+            logger.info(f"Exported {count} records to {path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error exporting snapshot to {path}: {e}")
+            return False
+    
+    def import_snapshot(self, path: str, start: Optional[int] = None, stop: Optional[int] = None) -> List[Dict]:
+        """
+        Replace the scanned records with records[start:stop] of a snapshot file.
+        Only the requested slice is decoded, so operators can split a large
+        snapshot between them.
+        """
+        try:
+            self.scanned_files = load_snapshot(path, start, stop)
+            logger.info(f"Imported {len(self.scanned_files)} records from {path}")
+            return self.scanned_files
+        except Exception as e:
+            logger.error(f"Error importing snapshot from {path}: {e}")
+            return []
+    
     def add_to_history(self, action: Dict):
         """Add an action to the history stack."""
         try:
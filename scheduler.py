@@ -0,0 +1,192 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower value wins, both when workers pick tasks and when results are delivered
+PRIORITY_PREVIEW = 0     # Decoding what the operator is looking at right now
+PRIORITY_COPY = 1        # The operator's own organize/undo/redo actions
+PRIORITY_BACKGROUND = 2  # Scanning, hashing, prefetching
+
+PRIORITY_NAMES = {
+    PRIORITY_PREVIEW: 'preview',
+    PRIORITY_COPY: 'copy',
+    PRIORITY_BACKGROUND: 'background',
+}
+
+
+class Task:
+    """Handle for a submitted job. Cancelling drops it if queued and suppresses its callbacks if running."""
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict, priority: int,
+                 callback: Optional[Callable[[Any], None]],
+                 error_callback: Optional[Callable[[Exception], None]],
+                 group: Optional[str]):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.callback = callback
+        self.error_callback = error_callback
+        self.group = group
+        self.submitted = time.perf_counter()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class TaskScheduler:
+    """
+    Runs work off the Tk main loop and hands results back to it.
+    Each priority class has its own queue. Workers are assigned lanes: a list
+    of priorities they serve, highest first. The default layout keeps one
+    worker free for previews, runs copies on exactly one worker (so they stay
+    ordered and never race on destination names), and gives background work
+    the rest. Results are delivered by a single root.after timer that drains
+    completed tasks in priority order within a small per-tick time budget,
+    so a burst of results cannot stall redraws.
+    """
+
+    def __init__(self, root, lanes: Optional[Sequence[Sequence[int]]] = None,
+                 poll_interval_ms: int = 15, dispatch_budget_ms: float = 8.0):
+        self.root = root
+        self.poll_interval_ms = poll_interval_ms
+        self.dispatch_budget = dispatch_budget_ms / 1000.0
+        self._queues: Dict[int, Deque[Task]] = {p: deque() for p in PRIORITY_NAMES}
+        self._condition = threading.Condition()
+        self._results: List = []
+        self._results_lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._active: set = set()
+        self._running = True
+
+        if lanes is None:
+            lanes = [
+                [PRIORITY_PREVIEW],
+                [PRIORITY_COPY],
+                [PRIORITY_PREVIEW, PRIORITY_BACKGROUND],
+                [PRIORITY_PREVIEW, PRIORITY_BACKGROUND],
+            ]
+        self._workers = [
+            threading.Thread(target=self._work, args=(list(lane),), name=f"TaskScheduler-{i}", daemon=True)
+            for i, lane in enumerate(lanes)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._dispatch_id = self.root.after(self.poll_interval_ms, self._dispatch)
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_BACKGROUND,
+               callback: Optional[Callable[[Any], None]] = None,
+               error_callback: Optional[Callable[[Exception], None]] = None,
+               group: Optional[str] = None, **kwargs) -> Task:
+        """
+        Run func(*args, **kwargs) on a worker. callback(result) or
+        error_callback(exception) is then called on the Tk main thread.
+        """
+        task = Task(func, args, kwargs, priority, callback, error_callback, group)
+        with self._condition:
+            self._queues[priority].append(task)
+            self._condition.notify_all()
+        metrics.inc(f"scheduler.submitted.{PRIORITY_NAMES[priority]}")
+        return task
+
+    def cancel_group(self, group: str):
+        """Cancel every queued or running task submitted with this group."""
+        with self._condition:
+            tasks = [task for queue in self._queues.values() for task in queue]
+            tasks.extend(self._active)
+        with self._results_lock:
+            tasks.extend(r[2] for r in self._results)
+        for task in tasks:
+            if task.group == group:
+                task.cancel()
+
+    def pending(self, priority: Optional[int] = None) -> int:
+        with self._condition:
+            if priority is not None:
+                return len(self._queues[priority])
+            return sum(len(q) for q in self._queues.values())
+
+    def shutdown(self):
+        self._running = False
+        with self._condition:
+            for queue in self._queues.values():
+                for task in queue:
+                    task.cancel()
+                queue.clear()
+            self._condition.notify_all()
+        try:
+            self.root.after_cancel(self._dispatch_id)
+        except Exception:
+            pass
+
+    def _next_task(self, lane: List[int]) -> Optional[Task]:
+        with self._condition:
+            while self._running:
+                for priority in lane:
+                    queue = self._queues[priority]
+                    while queue:
+                        task = queue.popleft()
+                        if not task.cancelled:
+                            self._active.add(task)
+                            return task
+                self._condition.wait()
+        return None
+
+    def _work(self, lane: List[int]):
+        while True:
+            task = self._next_task(lane)
+            if task is None:
+                return
+            metrics.observe(f"scheduler.wait.{PRIORITY_NAMES[task.priority]}",
+                            time.perf_counter() - task.submitted)
+            try:
+                with metrics.span(f"scheduler.run.{PRIORITY_NAMES[task.priority]}"):
+                    result, error = task.func(*task.args, **task.kwargs), None
+            except Exception as e:
+                logger.error(f"Task {getattr(task.func, '__name__', task.func)} failed: {e}")
+                result, error = None, e
+            with self._condition:
+                self._active.discard(task)
+            if task.cancelled:
+                continue
+            with self._results_lock:
+                self._results.append((task.priority, next(self._sequence), task, result, error))
+
+    def _dispatch(self):
+        """Deliver finished tasks on the main thread, most urgent first."""
+        with self._results_lock:
+            results, self._results = self._results, []
+        results.sort(key=lambda r: (r[0], r[1]))
+
+        deadline = time.perf_counter() + self.dispatch_budget
+        for index, (priority, _, task, result, error) in enumerate(results):
+            if time.perf_counter() > deadline:
+                # Hand the rest to the next tick so the UI can repaint in between
+                with self._results_lock:
+                    self._results = results[index:] + self._results
+                break
+            if task.cancelled:
+                continue
+            try:
+                if error is not None:
+                    if task.error_callback:
+                        task.error_callback(error)
+                elif task.callback:
+                    task.callback(result)
+            except Exception as e:
+                logger.error(f"Error in task callback: {e}")
+
+        if self._running:
+            self._dispatch_id = self.root.after(self.poll_interval_ms, self._dispatch)
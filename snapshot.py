@@ -0,0 +1,157 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Layout:
+#   MAGIC
+#   repeated: <uint32 length> <length bytes of compact UTF-8 JSON>   (one scan record each)
+#   <uint32 0>                                                        (end of records)
+#   <uint64 offset> * count                                           (index into the record area)
+#   <uint64 index_offset> <uint64 count> TRAILER_MAGIC
+# The record area can be produced and consumed as a stream; the index and
+# trailer let a reader jump straight to any record of a memory-mapped file.
+# Streams may also carry <uint32 0xFFFFFFFF> keepalive frames between records;
+# they never appear in files and readers skip them.
+MAGIC = b"MFSSNAP\x01"
+TRAILER_MAGIC = b"MFSSEND\x01"
+_LENGTH = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+_TRAILER = struct.Struct("<QQ8s")
+END_OF_RECORDS = _LENGTH.pack(0)
+_KEEPALIVE_LENGTH = 0xFFFFFFFF
+KEEPALIVE = _LENGTH.pack(_KEEPALIVE_LENGTH)
+
+
+def encode_record(record: Dict) -> bytes:
+    payload = json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def decode_record(payload) -> Dict:
+    record = json.loads(bytes(payload).decode('utf-8'))
+    # JSON has no tuples; keep dimensions the shape get_file_metadata produces
+    metadata = record.get('metadata')
+    if metadata and isinstance(metadata.get('dimensions'), list):
+        metadata['dimensions'] = tuple(metadata['dimensions'])
+    return record
+
+
+def write_snapshot(path: str, records: Iterable[Dict]) -> int:
+    """Write records to `path` atomically. Returns the number of records written."""
+    tmp_path = path + ".tmp"
+    offsets: List[int] = []
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        position = len(MAGIC)
+        for record in records:
+            data = encode_record(record)
+            offsets.append(position)
+            f.write(data)
+            position += len(data)
+        f.write(END_OF_RECORDS)
+        index_offset = position + _LENGTH.size
+        for offset in offsets:
+            f.write(_OFFSET.pack(offset))
+        f.write(_TRAILER.pack(index_offset, len(offsets), TRAILER_MAGIC))
+    os.replace(tmp_path, path)
+    return len(offsets)
+
+
+def iter_records(stream: BinaryIO) -> Iterator[Dict]:
+    """Read records sequentially from a file or pipe without needing the index."""
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a scan snapshot")
+    while True:
+        header = stream.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            raise ValueError("Truncated scan snapshot")
+        (length,) = _LENGTH.unpack(header)
+        if length == 0:
+            return
+        if length == _KEEPALIVE_LENGTH:
+            continue
+        payload = stream.read(length)
+        if len(payload) < length:
+            raise ValueError("Truncated scan snapshot")
+        yield decode_record(payload)
+
+
+class ScanSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file.
+    Opening is constant time; records are decoded only when accessed, so a
+    client can load just the slice it needs from a multi-million record file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a scan snapshot: {path}")
+            index_offset, count, trailer = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+            if trailer != TRAILER_MAGIC:
+                raise ValueError(f"Incomplete scan snapshot: {path}")
+            self._index_offset = index_offset
+            self._count = count
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _offset(self, i: int) -> int:
+        return _OFFSET.unpack_from(self._map, self._index_offset + i * _OFFSET.size)[0]
+
+    def _read(self, i: int) -> Dict:
+        offset = self._offset(i)
+        (length,) = _LENGTH.unpack_from(self._map, offset)
+        start = offset + _LENGTH.size
+        return decode_record(self._map[start:start + length])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._read(i) for i in range(*key.indices(self._count))]
+        if key < 0:
+            key += self._count
+        if not 0 <= key < self._count:
+            raise IndexError("snapshot index out of range")
+        return self._read(key)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self._count):
+            yield self._read(i)
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def open_snapshot(path: str) -> ScanSnapshot:
+    return ScanSnapshot(path)
+
+
+def load_snapshot(path: str, start: Optional[int] = None, stop: Optional[int] = None) -> List[Dict]:
+    """Decode records[start:stop] from a snapshot file."""
+    with ScanSnapshot(path) as snapshot:
+        return snapshot[start:stop]
@@ -0,0 +1,91 @@
+import bisect
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _pixels(metadata: Dict) -> int:
+    dimensions = metadata.get('dimensions')
+    if isinstance(dimensions, (tuple, list)) and len(dimensions) == 2:
+        return dimensions[0] * dimensions[1]
+    return -1
+
+
+# Raw keys captured by get_file_metadata; none of these parse display strings
+SORT_KEYS: Dict[str, Callable[[Dict], object]] = {
+    'name': lambda m: m.get('name', '').lower(),
+    'type': lambda m: m.get('type', ''),
+    'size': lambda m: m.get('size', 0),
+    'modified': lambda m: m.get('modified_ts', 0.0),
+    'dimensions': _pixels,
+    'duration': lambda m: m.get('duration', -1.0),
+}
+
+
+class SortIndex:
+    """
+    One cached sort order per column over a set of scanned records.
+    An order is built the first time its column is requested and then kept
+    current by add()/remove(), which cost a binary search plus a list
+    insert/delete instead of a full re-sort; remove_many() drops a whole
+    batch in one pass.
+    """
+
+    def __init__(self, records: Optional[List[Dict]] = None):
+        self._records: Dict[int, Dict] = {}  # id(record) -> record
+        self._orders: Dict[str, Tuple[List[tuple], List[Dict]]] = {}
+        self.set_records(records or [])
+
+    def set_records(self, records: List[Dict]):
+        self._records = {id(r): r for r in records}
+        self._orders.clear()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def _key(column: str, record: Dict) -> tuple:
+        # id() breaks ties so every record has a unique, findable position
+        return (SORT_KEYS[column](record['metadata']), id(record))
+
+    def _order(self, column: str) -> Tuple[List[tuple], List[Dict]]:
+        order = self._orders.get(column)
+        if order is None:
+            pairs = sorted(((self._key(column, r), r) for r in self._records.values()), key=lambda p: p[0])
+            order = self._orders[column] = ([k for k, _ in pairs], [r for _, r in pairs])
+        return order
+
+    def order(self, column: str, descending: bool = False) -> List[Dict]:
+        """Records sorted by column. The returned list must not be modified."""
+        if column not in SORT_KEYS:
+            raise ValueError(f"Unknown sort column: {column}")
+        items = self._order(column)[1]
+        return items[::-1] if descending else items
+
+    def add(self, record: Dict):
+        if id(record) in self._records:
+            return
+        self._records[id(record)] = record
+        for column, (keys, items) in self._orders.items():
+            key = self._key(column, record)
+            position = bisect.bisect_left(keys, key)
+            keys.insert(position, key)
+            items.insert(position, record)
+
+    def remove_many(self, records: List[Dict]):
+        """Remove several records with one pass over each cached order."""
+        removed = {id(r) for r in records if self._records.pop(id(r), None) is not None}
+        if not removed:
+            return
+        for keys, items in self._orders.values():
+            # The last element of every key is id(record)
+            keys[:] = [key for key in keys if key[-1] not in removed]
+            items[:] = [item for item in items if id(item) not in removed]
+
+    def remove(self, record: Dict):
+        if self._records.pop(id(record), None) is None:
+            return
+        for column, (keys, items) in self._orders.items():
+            key = self._key(column, record)
+            position = bisect.bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+                del items[position]
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+from PIL import Image
+
+from metrics import metrics
+from safe_decode import SafeDecoder, DecodeFailure, DecodedImage, open_downscaled
+from video_probe import VIDEO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".media_sorter", "thumbnails")
+DEFAULT_TILE_SIZE = 160
+DEFAULT_BATCH_SIZE = 32
+
+
+def cache_key(path: str, tile_size: int) -> Optional[str]:
+    """Key that changes whenever the file changes, so stale thumbnails are never reused."""
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{os.path.abspath(path)}|{file_stat.st_size}|{file_stat.st_mtime_ns}|{tile_size}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _decode_small(path: str, tile_size: int) -> Optional[Image.Image]:
+    if path.lower().endswith(VIDEO_EXTENSIONS):
+        cap = cv2.VideoCapture(path)
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            return None
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    else:
+        # JPEG decodes at 1/2-1/8 scale and raw layouts band by band, so huge files stay small
+        img = open_downscaled(path, (tile_size * 2, tile_size * 2))
+    img.thumbnail((tile_size, tile_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img
+
+
+def load_thumbnail(path: str, tile_size: int = DEFAULT_TILE_SIZE,
+                   cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Optional[DecodedImage]:
+    """Read a thumbnail from the disk cache, or decode and cache it."""
+    key = cache_key(path, tile_size)
+    if key is None:
+        return None
+    cached_path = os.path.join(cache_dir, key[:2], f"{key}.jpg") if cache_dir else None
+    try:
+        if cached_path and os.path.exists(cached_path):
+            with Image.open(cached_path) as img:
+                img.load()
+                return img.mode, img.size, img.tobytes()
+        img = _decode_small(path, tile_size)
+        if img is None:
+            return None
+        if cached_path:
+            try:
+                os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+                tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+                img.save(tmp_path, 'JPEG', quality=85)
+                os.replace(tmp_path, cached_path)
+            except Exception as e:
+                logger.error(f"Error caching thumbnail for {path}: {e}")
+        return img.mode, img.size, img.tobytes()
+    except Exception as e:
+        logger.error(f"Error generating thumbnail for {path}: {e}")
+        return None
+
+
+class ThumbnailCache:
+    """In-memory LRU in front of the shared on-disk cache."""
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self._items: "OrderedDict[Tuple[str, int], Optional[DecodedImage]]" = OrderedDict()
+
+    def get(self, path: str, tile_size: int):
+        """Returns the cached data, None for a known failure, or KeyError if absent."""
+        key = (path, tile_size)
+        data = self._items[key]
+        self._items.move_to_end(key)
+        return data
+
+    def __contains__(self, key) -> bool:
+        return key in self._items
+
+    def put(self, path: str, tile_size: int, data: Optional[DecodedImage]):
+        key = (path, tile_size)
+        self._items[key] = data
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def invalidate(self, path: str):
+        for key in [k for k in self._items if k[0] == path]:
+            del self._items[key]
+
+
+class ThumbnailBatcher:
+    """
+    Generates thumbnails for batches of paths on memory- and time-limited
+    worker processes. Each path is its own task with its own time limit, so
+    a pathological file fails alone and never holds a worker for the batch.
+    """
+
+    def __init__(self, processes: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR, cache: Optional[ThumbnailCache] = None):
+        self.batch_size = batch_size
+        self.cache_dir = cache_dir
+        self.cache = cache or ThumbnailCache()
+        self._decoder = SafeDecoder(processes=processes or max(1, (os.cpu_count() or 2) - 1))
+        # Feeds the decoder's processes; SafeDecoder itself caps the tasks in flight
+        self._threads = ThreadPoolExecutor(max_workers=self._decoder.processes, thread_name_prefix="thumbnail")
+
+    def batches(self, paths: List[str]) -> List[List[str]]:
+        return [paths[i:i + self.batch_size] for i in range(0, len(paths), self.batch_size)]
+
+    def run_batch(self, paths: List[str], tile_size: int = DEFAULT_TILE_SIZE) -> Dict[str, Optional[DecodedImage]]:
+        """Blocking: generate one batch across the worker processes. Call from a worker thread."""
+        with metrics.span('thumbnail.batch'):
+            results = list(self._threads.map(lambda path: self._run_one(path, tile_size), paths))
+        metrics.inc('thumbnail.generated', len(results))
+        return dict(results)
+
+    def _run_one(self, path: str, tile_size: int) -> Tuple[str, Optional[DecodedImage]]:
+        try:
+            return path, self._decoder.call(load_thumbnail, path, tile_size, self.cache_dir)
+        except DecodeFailure as e:
+            logger.error(f"Error generating thumbnail for {path}: {e}")
+            return path, None
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._decoder.shutdown()
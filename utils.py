@@ -10,7 +10,12 @@ import logging
 import cv2
 from PIL import Image
 import threading
+import mmap
 from tkinter import ttk
+from metrics import metrics
+from io_governor import governor, FOREGROUND, BACKGROUND
+from safe_decode import decoder, DecodeFailure, placeholder_image
+from video_probe import VIDEO_EXTENSIONS
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -19,19 +24,140 @@ logger = logging.getLogger(__name__)
 def get_file_hash(filepath: str) -> str:
     try:
         hasher = hashlib.md5()
-        with open(filepath, 'rb') as f:
-            buf = f.read(65536)  # Read in 64kb chunks
-            while len(buf) > 0:
+        total = 0
+        with metrics.span('hash'), open(filepath, 'rb') as f:
+            # Scan-time hashing is background I/O; it yields to the operator's copies
+            for buf in governor.read_chunks(f, BACKGROUND):
                 hasher.update(buf)
-                buf = f.read(65536)
+                total += len(buf)
+        metrics.inc('hash.bytes', total)
         return hasher.hexdigest()
     except Exception as e:
+        # The 'hash' span has already counted this in hash.errors
         logger.error(f"Error generating hash for {filepath}: {e}")
         return "hash_error"
 
+LARGE_FILE_THRESHOLD = 100 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+FINGERPRINT_SAMPLES = 8
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+HASH_SEGMENT_SIZE = 64 * 1024 * 1024
+
+def iter_file_chunks(filepath: str, offset: int = 0, chunk_size: int = HASH_CHUNK_SIZE,
+                     use_mmap: bool = False, priority: int = BACKGROUND):
+    """
+    Yield the contents of a file from `offset` in chunks, paced by the I/O governor.
+    With use_mmap the chunks are zero-copy memoryviews over a read-only mapping.
+    """
+    with open(filepath, 'rb') as f:
+        file_stat = os.fstat(f.fileno())
+        if use_mmap and file_stat.st_size > offset:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mapped)
+                try:
+                    for start in range(offset, file_stat.st_size, chunk_size):
+                        governor.throttle(file_stat.st_dev, chunk_size, priority)
+                        chunk = view[start:start + chunk_size]
+                        try:
+                            yield chunk
+                        finally:
+                            chunk.release()
+                finally:
+                    view.release()
+                    if priority == BACKGROUND:
+                        governor.drop_cache(f.fileno())
+            return
+        f.seek(offset)
+        yield from governor.read_chunks(f, priority, chunk_size)
+
+def get_file_fingerprint(filepath: str, algorithm: str = 'blake2b',
+                         samples: int = FINGERPRINT_SAMPLES,
+                         sample_size: int = FINGERPRINT_SAMPLE_SIZE) -> str:
+    """
+    Cheap content fingerprint for large files: the size plus a digest of
+    `samples` fixed-size blocks taken at evenly spaced offsets (always
+    including the first and last block). Equal files always match; files
+    that differ only between the sampled blocks can collide.
+    """
+    try:
+        with metrics.span('fingerprint'), open(filepath, 'rb') as f:
+            file_stat = os.fstat(f.fileno())
+            size = file_stat.st_size
+            hasher = hashlib.new(algorithm)
+            hasher.update(size.to_bytes(8, 'little'))
+            last = max(size - sample_size, 0)
+            count = max(samples, 2)
+            offsets = sorted({last * i // (count - 1) for i in range(count)})
+            for offset in offsets:
+                governor.throttle(file_stat.st_dev, sample_size, BACKGROUND)
+                f.seek(offset)
+                hasher.update(f.read(sample_size))
+        metrics.inc('fingerprint.bytes', len(offsets) * sample_size)
+        return f"{size}:{hasher.hexdigest()}"
+    except Exception as e:
+        logger.error(f"Error generating fingerprint for {filepath}: {e}")
+        return "fingerprint_error"
+
+class SegmentedHash:
+    """
+    Content hash built from fixed-size segments: each segment is digested on
+    its own and the final digest covers the list of segment digests. Unlike a
+    plain hashlib object its progress can be saved and resumed at any segment
+    boundary, which makes it suitable for multi-GB files hashed in the background.
+    """
+
+    def __init__(self, algorithm: str = 'blake2b', segment_size: int = HASH_SEGMENT_SIZE,
+                 segments: Optional[List[str]] = None):
+        self.algorithm = algorithm
+        self.segment_size = segment_size
+        self.segments: List[str] = list(segments or [])
+        self._current = hashlib.new(algorithm)
+        self._current_len = 0
+
+    @classmethod
+    def from_name(cls, name: str) -> 'SegmentedHash':
+        """Inverse of `name`, e.g. 'blake2b-seg64m'."""
+        algorithm, segment = name.split('-seg')
+        return cls(algorithm, int(segment.rstrip('m')) * 1024 * 1024)
+
+    @property
+    def name(self) -> str:
+        return f"{self.algorithm}-seg{self.segment_size // (1024 * 1024)}m"
+
+    @property
+    def completed_bytes(self) -> int:
+        """Bytes covered by finished segments, i.e. the safe resume offset."""
+        return len(self.segments) * self.segment_size
+
+    def update(self, data):
+        data = memoryview(data)
+        while len(data):
+            take = min(len(data), self.segment_size - self._current_len)
+            self._current.update(data[:take])
+            self._current_len += take
+            data = data[take:]
+            if self._current_len == self.segment_size:
+                self.segments.append(self._current.hexdigest())
+                self._current = hashlib.new(self.algorithm)
+                self._current_len = 0
+
+    def hexdigest(self) -> str:
+        final = hashlib.new(self.algorithm)
+        for digest in self.segments:
+            final.update(bytes.fromhex(digest))
+        if self._current_len:
+            final.update(bytes.fromhex(self._current.hexdigest()))
+        return final.hexdigest()
+
 def generate_thumbnail(file_path: str, container_size: Tuple[int, int]) -> Optional[Image.Image]:
+    with metrics.span('thumbnail'):
+        return _generate_thumbnail(file_path, container_size)
+
+def _generate_thumbnail(file_path: str, container_size: Tuple[int, int]) -> Optional[Image.Image]:
     try:
-        if file_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
+        if file_path.lower().endswith(VIDEO_EXTENSIONS):
             # Handle video files
             cap = cv2.VideoCapture(file_path)
             ret, frame = cap.read()
@@ -44,8 +170,14 @@ def generate_thumbnail(file_path: str, container_size: Tuple[int, int]) -> Optio
             else:
                 return None
         else:
-            # Handle image files
-            img = Image.open(file_path)
+            # Images decode in a limited worker process, already downscaled
+            try:
+                mode, size, data = decoder.decode(file_path, container_size)
+            except DecodeFailure as e:
+                logger.error(f"Error decoding image {file_path}: {e}")
+                metrics.inc('thumbnail.errors')
+                return placeholder_image(container_size)
+            img = Image.frombytes(mode, size, data)
         
         # Convert to RGB if necessary
         if img.mode in ('RGBA', 'P'):
@@ -78,6 +210,7 @@ def generate_thumbnail(file_path: str, container_size: Tuple[int, int]) -> Optio
         
     except Exception as e:
         logger.error(f"Error generating thumbnail for {file_path}: {e}")
+        metrics.inc('thumbnail.errors')
         return None
 
 def get_safe_size(file_stat) -> int:
@@ -94,7 +227,8 @@ def get_safe_time(timestamp) -> str:
 
 def get_file_metadata(filepath: str) -> Dict:
     try:
-        file_stat = os.stat(filepath)
+        with metrics.span('metadata.stat'):
+            file_stat = os.stat(filepath)
         file_type = mimetypes.guess_type(filepath)[0] or "unknown"
         
         metadata = {
@@ -103,16 +237,21 @@ def get_file_metadata(filepath: str) -> Dict:
             "created": get_safe_time(file_stat.st_ctime),
             "modified": get_safe_time(file_stat.st_mtime),
             "type": file_type,
+            # Raw timestamps for sorting; "created"/"modified" are display strings
+            "created_ts": file_stat.st_ctime,
+            "modified_ts": file_stat.st_mtime,
         }
         
-        if metadata["size"] < 100 * 1024 * 1024:
+        if metadata["size"] < LARGE_FILE_THRESHOLD:
             metadata["hash"] = get_file_hash(filepath)
         else:
+            # Full hash is filled in later by hasher.BackgroundHasher
             metadata["hash"] = "large_file"
+            metadata["fingerprint"] = get_file_fingerprint(filepath)
         
         if file_type and file_type.startswith('image'):
             try:
-                with Image.open(filepath) as img:
+                with metrics.span('metadata.image_probe'), Image.open(filepath) as img:
                     metadata.update({
                         "dimensions": img.size,
                         "format": img.format,
@@ -135,16 +274,126 @@ def get_file_metadata(filepath: str) -> Dict:
             "created": "Unknown",
             "modified": "Unknown",
             "type": "unknown",
+            "created_ts": 0.0,
+            "modified_ts": 0.0,
             "hash": "error"
         }
 
-def safe_copy_file(src: str, dest: str) -> bool:
+def _governed_copy(src: str, dest: str, src_device: int, dest_device: int, hasher=None):
+    """
+    Chunked copy paced by the foreground rate limit, then copy metadata like copy2.
+    If a hasher is given, every chunk is fed to it on the way through.
+    """
+    with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+        for buf in governor.read_chunks(fsrc, FOREGROUND):
+            if dest_device != src_device:
+                governor.throttle(dest_device, len(buf), FOREGROUND)
+            if hasher is not None:
+                hasher.update(buf)
+            fdst.write(buf)
+    shutil.copystat(src, dest)
+
+def new_hasher(hash_name: str):
+    """hashlib object or SegmentedHash for a name stored in metadata['hash_algorithm']."""
+    if '-seg' in hash_name:
+        return SegmentedHash.from_name(hash_name)
+    return hashlib.new(hash_name)
+
+def get_hash_spec(metadata: Dict) -> Tuple[str, Optional[str]]:
+    """
+    Which digest a copy should compute to be comparable with the scan, and the
+    scan-time value to compare against (None when no full hash is known yet).
+    """
+    hash_value = metadata.get('hash', '')
+    if metadata.get('hash_algorithm'):
+        return metadata['hash_algorithm'], hash_value
+    if metadata.get('size', 0) >= LARGE_FILE_THRESHOLD:
+        # Same digest BackgroundHasher would produce, so later audits can match it
+        return SegmentedHash().name, None
+    if len(hash_value) == 32 and all(c in '0123456789abcdef' for c in hash_value):
+        return 'md5', hash_value
+    return 'md5', None
+
+def _remove_partial(dest: str):
+    """Delete a copy that failed partway; it is not in the history, so undo can't."""
+    try:
+        os.remove(dest)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Error removing partial copy {dest}: {e}")
+
+def _prepare_copy(src: str, dest: str, devices: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    (source, destination) devices for the I/O governor. Without known devices
+    this creates the destination folder and stats both sides first.
+    """
+    if devices is not None:
+        return devices
+    dest_dir = os.path.dirname(dest)
+    os.makedirs(dest_dir, exist_ok=True)
+    return os.stat(src).st_dev, os.stat(dest_dir).st_dev
+
+def copy_and_verify(src: str, dest: str, hash_name: str = 'md5',
+                    expected_hash: Optional[str] = None,
+                    devices: Optional[Tuple[int, int]] = None) -> Dict:
+    """
+    Copy src to dest while hashing the stream, so the copy is verified with a
+    single read of the source. If expected_hash is given and does not match,
+    the copy is removed and reported as failed.
+    Pass devices (source, destination st_dev) when the destination folder is
+    known to exist, to skip the per-file makedirs and stat calls.
+    Returns {'success', 'digest', 'hash_algorithm', 'verified'}; verified is
+    None when there was nothing to compare against.
+    """
+    result = {'success': False, 'digest': None, 'hash_algorithm': hash_name, 'verified': None}
+    copying = False
+    try:
+        with metrics.span('copy.verified'):
+            src_device, dest_device = _prepare_copy(src, dest, devices)
+            hasher = new_hasher(hash_name)
+            copying = True
+            with governor.foreground(src_device, dest_device):
+                _governed_copy(src, dest, src_device, dest_device, hasher)
+        result['digest'] = hasher.hexdigest()
+        if expected_hash:
+            result['verified'] = result['digest'] == expected_hash
+            if not result['verified']:
+                logger.error(f"Checksum mismatch copying {src} to {dest}: "
+                             f"expected {expected_hash}, got {result['digest']}")
+                metrics.inc('copy.verify_failures')
+                os.remove(dest)
+                return result
+        result['success'] = True
+        metrics.inc('copy.files')
+        return result
+    except Exception as e:
+        logger.error(f"Error copying file {src} to {dest}: {e}")
+        if copying:
+            _remove_partial(dest)
+        return result
+
+def safe_copy_file(src: str, dest: str, devices: Optional[Tuple[int, int]] = None) -> bool:
+    """Copy src to dest; devices skips the folder setup as in copy_and_verify."""
+    copying = False
     try:
-        os.makedirs(os.path.dirname(dest), exist_ok=True)
-        shutil.copy2(src, dest)
+        with metrics.span('copy'):
+            src_device, dest_device = _prepare_copy(src, dest, devices)
+            copying = True
+            # Background hashing on either device pauses while the copy runs
+            with governor.foreground(src_device, dest_device):
+                if governor.is_limited(src_device, FOREGROUND) or governor.is_limited(dest_device, FOREGROUND):
+                    _governed_copy(src, dest, src_device, dest_device)
+                else:
+                    shutil.copy2(src, dest)
+        metrics.inc('copy.files')
+        if metrics.enabled:
+            metrics.inc('copy.bytes', os.path.getsize(dest))
         return True
     except Exception as e:
         logger.error(f"Error copying file {src} to {dest}: {e}")
+        if copying:
+            _remove_partial(dest)
         return False
 
 def generate_unique_filename(filepath: str) -> str:
@@ -154,6 +403,7 @@ def generate_unique_filename(filepath: str) -> str:
     counter = 1
     
     while os.path.exists(filepath):
+        metrics.inc('unique_name.probes')
         filepath = os.path.join(directory, f"{name}_{counter}{ext}")
         counter += 1
     
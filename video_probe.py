@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+# ISO base media (MP4/MOV) files are probed by reading their box headers directly
+ISO_MEDIA_EXTENSIONS = ('.mp4', '.mov', '.m4v')
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".media_sorter", "video_probe.json")
+DEFAULT_PROBE_WORKERS = 8
+
+# Boxes that only contain other boxes on the way to the sample tables
+_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+def _iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload_start, box_end) for the boxes in [start, end) without reading payloads."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+        yield kind, position + header_size, position + size
+        position += size
+
+
+def _read(f: BinaryIO, start: int, end: int, limit: int) -> bytes:
+    f.seek(start)
+    return f.read(min(end - start, limit))
+
+
+def _parse_track(f: BinaryIO, start: int, end: int) -> Dict:
+    track: Dict = {}
+    stack = [(start, end)]
+    while stack:
+        box_start, box_end = stack.pop()
+        for kind, payload, box_stop in _iter_boxes(f, box_start, box_end):
+            if kind in _CONTAINER_BOXES:
+                stack.append((payload, box_stop))
+            elif kind == b'tkhd':
+                data = _read(f, payload, box_stop, 96)
+                offset = 40 if data[0] == 0 else 52  # Matrix follows the v0/v1 time fields
+                a, b = struct.unpack('>ii', data[offset:offset + 8])
+                width, height = struct.unpack('>II', data[offset + 36:offset + 44])
+                track['dimensions'] = (width >> 16, height >> 16)
+                # A 90/270 degree display matrix swaps the displayed width and height
+                track['rotated'] = a == 0 and abs(b) == 1 << 16
+            elif kind == b'hdlr':
+                # QuickTime has a second (data) handler inside minf; the media handler comes first
+                track.setdefault('handler', _read(f, payload, box_stop, 12)[8:12])
+            elif kind == b'mdhd':
+                data = _read(f, payload, box_stop, 32)
+                if data[0] == 1:
+                    track['timescale'], track['duration'] = struct.unpack('>IQ', data[20:32])
+                else:
+                    track['timescale'], track['duration'] = struct.unpack('>II', data[12:20])
+            elif kind == b'stsd':
+                track['codec'] = _read(f, payload, box_stop, 16)[12:16].decode('latin-1').strip()
+            elif kind == b'stts':
+                count = struct.unpack('>I', _read(f, payload, box_stop, 8)[4:8])[0]
+                entries = _read(f, payload + 8, box_stop, count * 8)
+                track['frame_count'] = sum(
+                    struct.unpack('>I', entries[i:i + 4])[0] for i in range(0, len(entries) - 7, 8)
+                )
+    return track
+
+
+def probe_iso_media(path: str) -> Dict:
+    """Read duration, resolution, codec and frame rate from MP4/MOV box headers. No frames are decoded."""
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        # moov is often after mdat; skipping a box is a seek, not a read
+        moov = next(((p, e) for kind, p, e in _iter_boxes(f, 0, file_size) if kind == b'moov'), None)
+        if moov is None:
+            return {}
+        info: Dict = {}
+        for kind, payload, box_end in _iter_boxes(f, *moov):
+            if kind == b'mvhd':
+                data = _read(f, payload, box_end, 32)
+                if data[0] == 1:
+                    timescale, duration = struct.unpack('>IQ', data[20:32])
+                else:
+                    timescale, duration = struct.unpack('>II', data[12:20])
+                if timescale and duration:
+                    info['duration'] = round(duration / timescale, 3)
+            elif kind == b'trak':
+                track = _parse_track(f, payload, box_end)
+                if track.get('handler') != b'vide' or 'dimensions' in info:
+                    continue
+                width, height = track.get('dimensions', (0, 0))
+                if width and height:
+                    info['dimensions'] = (height, width) if track.get('rotated') else (width, height)
+                if track.get('codec'):
+                    info['codec'] = track['codec']
+                frames, timescale, duration = track.get('frame_count'), track.get('timescale'), track.get('duration')
+                if frames:
+                    info['frame_count'] = frames
+                    if timescale and duration:
+                        info['fps'] = round(frames * timescale / duration, 3)
+    return info
+
+
+def probe_capture(path: str) -> Dict:
+    """Fallback for other containers: OpenCV's stream properties, without reading a frame."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return {}
+        info: Dict = {}
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        if width and height:
+            info['dimensions'] = (width, height)
+        if fourcc:
+            info['codec'] = ''.join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip('\x00 ')
+        if frames > 0:
+            info['frame_count'] = frames
+        if fps > 0:
+            info['fps'] = round(fps, 3)
+            if frames > 0:
+                info['duration'] = round(frames / fps, 3)
+        return info
+    finally:
+        cap.release()
+
+
+def probe_video(path: str) -> Dict:
+    """
+    Probe a video's stream metadata.
+    Returns:
+        Dict with any of 'duration' (seconds), 'dimensions', 'codec', 'fps'
+        and 'frame_count'; empty if the file could not be probed
+    """
+    info: Dict = {}
+    if path.lower().endswith(ISO_MEDIA_EXTENSIONS):
+        try:
+            info = probe_iso_media(path)
+        except (OSError, struct.error, IndexError) as e:
+            logger.error(f"Error parsing video headers for {path}: {e}")
+    if 'duration' not in info or 'dimensions' not in info:
+        try:
+            info = {**probe_capture(path), **info}
+        except Exception as e:
+            logger.error(f"Error probing video {path}: {e}")
+    return info
+
+
+class ProbeCache:
+    """Probe results on disk, keyed by path, size and mtime so edited files are re-probed."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, metadata: Dict) -> str:
+        return f"{os.path.abspath(path)}|{metadata.get('size', 0)}|{metadata.get('modified_ts', 0.0)}"
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error loading video probe cache {self.path}: {e}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key: str, info: Dict):
+        with self._lock:
+            self._load()[key] = info
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._entries, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Error saving video probe cache {self.path}: {e}")
+
+
+class VideoProber:
+    """
+    Adds stream metadata to scanned video records.
+    Probes run on an executor supplied by the scan, so they overlap with the
+    directory walk, and successful results are reused across scans through
+    ProbeCache; failed probes are retried on the next scan.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PROBE_WORKERS, cache: Optional[ProbeCache] = None):
+        self.workers = workers
+        self.cache = cache or ProbeCache()
+
+    def submit(self, executor: Executor, records: List[Dict]) -> List[Future]:
+        """Start probing the video records in a batch; cached results are applied immediately."""
+        futures = []
+        for file_info in records:
+            if not file_info['path'].lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            key = ProbeCache.key(file_info['path'], file_info['metadata'])
+            cached = self.cache.get(key)
+            # Empty entries (failed probes) written by older versions count as misses
+            if cached:
+                metrics.inc('video_probe.cache_hits')
+                self._apply(file_info, cached)
+            else:
+                futures.append(executor.submit(self._probe, file_info, key))
+        return futures
+
+    def _probe(self, file_info: Dict, key: str):
+        start = time.perf_counter()
+        info = probe_video(file_info['path'])
+        metrics.observe('video_probe', time.perf_counter() - start)
+        # A failed probe may be a file still being copied or a transient NAS error: try again next scan
+        if info:
+            self.cache.put(key, info)
+        self._apply(file_info, info)
+
+    @staticmethod
+    def _apply(file_info: Dict, info: Dict):
+        metadata = file_info['metadata']
+        metadata.update(info)
+        if isinstance(metadata.get('dimensions'), list):
+            metadata['dimensions'] = tuple(metadata['dimensions'])  # JSON cache stores lists